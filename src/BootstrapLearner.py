@@ -1,27 +1,293 @@
+import os
+import tempfile
+
 import numpy as np
 
+from model_io import save_arrays, load_arrays
+from parallel import resolve_jobs, run_parallel
+from PERTLearner import PERTLearner, NODE_ARRAYS
+
+# Upper bound on (tree, row) pairs routed at once by the packed forest
+MAX_PACKED_PAIRS = 2 ** 22
+
+
+def _train_bag(learner_type, parameters, bag_seed, x, y):
+    """Train one bag, returns the learner and the mask of rows it sampled
+
+    The sample and the tree each get their own stream spawned from bag_seed.
+    """
+
+    sample_seed, learner_seed = bag_seed.spawn(2)
+    num_rows = len(x)
+    sample = np.random.default_rng(sample_seed).integers(0, num_rows, size=num_rows)
+    learner = learner_type(**parameters, seed=learner_seed)
+    learner.train(x[sample], y[sample])
+    in_bag = np.bincount(sample, minlength=num_rows) > 0
+    return learner, in_bag
+
+
+def _attach_training_data(paths):
+    """Memory-map the training data written by _train_parallel, once per pool worker"""
+    return [np.load(path, mmap_mode="r") for path in paths]
+
+
+def _train_shared_bag(data, learner_type, parameters, bag_seed):
+    return _train_bag(learner_type, parameters, bag_seed, *data)
+
 
 class BootstrapLearner:
+    """Bagged ensemble of constituent learners
+
+    Constituents are built as constituent(**kwargs, seed=...) and must provide train(x, y) and test(x).
+    Every bag draws from its own stream spawned from seed, so a seeded forest is reproducible for any n_jobs.
+    """
 
-    def __init__(self, constituent, kwargs, bags=20):
+    def __init__(self, constituent, kwargs, bags=20, seed=None, n_jobs=1):
         self.learner_type = constituent
         self.parameters = kwargs
         self.bags = bags
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.n_jobs = n_jobs
         self.learners = np.empty(bags, dtype=object)
+        self.in_bag = None
+        self.roots = None
+        self.n_features = None
+        self.features = None
 
     def train(self, x, y):
-        num_rows = len(x)
-        for i in range(self.bags):
-            sample = np.random.randint(0, num_rows, size=num_rows)
-            learner = self.learner_type(**self.parameters)
-            learner.train(x[sample], y[sample])
-            self.learners[i] = learner
+        self.n_features = np.shape(x)[1]
+        self.learners, self.in_bag = self._train_bags(x, y, self.bags)
+        self.pack()
+
+    def grow(self, x, y, bags):
+        """Warm start, append bags more trees trained on the same x and y
+
+        The new bags continue the seed streams, so training 20 bags then growing 25 gives the same forest as 45 bags
+        """
+
+        if self.in_bag is None or len(x) != self.in_bag.shape[1]:
+            raise ValueError("Growing a learner needs the training data it was trained on")
+        learners, in_bag = self._train_bags(x, y, bags)
+        self.learners = np.concatenate([self.learners, learners])
+        self.in_bag = np.concatenate([self.in_bag, in_bag])
+        self.bags += bags
+        self.pack()
+
+    def _train_bags(self, x, y, bags):
+        """Train the next bags learners, returns them with their in bag masks"""
+
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+        bag_seeds = self.seed_sequence.spawn(bags)
+        n_jobs = resolve_jobs(self.n_jobs, bags)
+        if n_jobs == 1:
+            results = [_train_bag(self.learner_type, self.parameters, bag_seed, x, y) for bag_seed in bag_seeds]
+        else:
+            results = self._train_parallel(x, y, bag_seeds, n_jobs)
+
+        # Keep which training rows each bag saw for out of bag estimates
+        learners = np.empty(bags, dtype=object)
+        in_bag = np.zeros((bags, len(x)), dtype=bool)
+        for i, (learner, bag_mask) in enumerate(results):
+            learners[i] = learner
+            in_bag[i] = bag_mask
+        return learners, in_bag
+
+    def _train_parallel(self, x, y, bag_seeds, n_jobs):
+
+        # Write the training data once and let every worker memory-map it instead of pickling it per bag
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            x_path = os.path.join(tmp_dir, "x.npy")
+            y_path = os.path.join(tmp_dir, "y.npy")
+            np.save(x_path, x)
+            np.save(y_path, y)
+            tasks = [(self.learner_type, self.parameters, bag_seed) for bag_seed in bag_seeds]
+            return run_parallel(_train_shared_bag, tasks, n_jobs, shared=(x_path, y_path), load=_attach_training_data)
+
+    def pack(self):
+        """Concatenate the trees' node arrays into one packed forest
+
+        Tree i owns nodes roots[i]:roots[i + 1] and its child indices stay local to the tree,
+        so each tree's arrays are plain slices of the packed ones.
+        Only possible for constituents stored as flat node arrays like PERTLearner.
+        """
+
+        if not all(hasattr(learner, "feature") for learner in self.learners):
+            self.roots = None
+            return
+
+        sizes = [len(learner.feature) for learner in self.learners]
+        self.roots = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        self.feature = np.concatenate([learner.feature for learner in self.learners])
+        self.split_val = np.concatenate([learner.split_val for learner in self.learners])
+        self.y_val = np.concatenate([learner.y_val for learner in self.learners])
+        self.left = np.concatenate([learner.left for learner in self.learners])
+        self.right = np.concatenate([learner.right for learner in self.learners])
+        self._link()
+
+    def _link(self):
+        """Stepping arrays of the packed forest, built from the node arrays and never saved
+
+        children[2 * node] and children[2 * node + 1] are a node's left and right children as packed indices,
+        and a leaf is its own child on both sides (its NaN split value also sends every row right),
+        so pairs that reach a leaf stay there without any bookkeeping.
+        """
+
+        tree = np.repeat(np.arange(len(self.roots)), np.diff(np.append(self.roots, len(self.feature))))
+        leaf = self.feature < 0
+        nodes = np.arange(len(self.feature))
+        self.children = np.empty(2 * len(nodes), dtype=np.int64)
+        self.children[0::2] = np.where(leaf, nodes, self.roots[tree] + self.left)
+        self.children[1::2] = np.where(leaf, nodes, self.roots[tree] + self.right)
+        self.step_feature = np.where(leaf, 0, self.feature).astype(np.intp)
+
+    def save(self, path, features=None):
+        """Save the packed forest, in bag masks and seed state to a model file
+
+        features names the input columns in training order, so scoring code can check what it passes in
+        """
+
+        if self.roots is None:
+            raise ValueError("Only trained forests of flat node array learners can be saved")
+        features = self.features if features is None else list(features)
+        if features is not None and len(features) != self.n_features:
+            raise ValueError(f"{len(features)} feature names for a forest trained on {self.n_features} features")
+        arrays = {name: getattr(self, name) for name in NODE_ARRAYS}
+        arrays["roots"] = self.roots
+        arrays["in_bag"] = self.in_bag
+        meta = {
+            "model": "BootstrapLearner",
+            "constituent": self.learner_type.__name__,
+            "parameters": self.parameters,
+            "bags": self.bags,
+            "n_features": self.n_features,
+            "features": features,
+            "entropy": self.seed_sequence.entropy,
+            "spawn_key": list(self.seed_sequence.spawn_key),
+            "n_children_spawned": self.seed_sequence.n_children_spawned,
+        }
+        save_arrays(path, arrays, meta)
+
+    @classmethod
+    def load(cls, path, mmap=True, n_jobs=1):
+        """Load a forest saved with save, memory-mapped unless mmap is False
+
+        Each constituent's node arrays are slices of the packed arrays, so a mapped forest is never copied
+        """
+
+        arrays, meta = load_arrays(path, mmap=mmap)
+        if meta["model"] != "BootstrapLearner":
+            raise ValueError(f"{path} holds a {meta['model']}, not a BootstrapLearner")
+        constituents = {"PERTLearner": PERTLearner}
+        learner = cls(constituents[meta["constituent"]], meta["parameters"], bags=meta["bags"], n_jobs=n_jobs)
+        learner.seed_sequence = np.random.SeedSequence(meta["entropy"], spawn_key=meta["spawn_key"],
+                                                       n_children_spawned=meta["n_children_spawned"])
+        for name in NODE_ARRAYS:
+            setattr(learner, name, arrays[name])
+        learner.roots = arrays["roots"]
+        learner.in_bag = arrays["in_bag"]
+        learner.n_features = meta.get("n_features")
+        learner.features = meta.get("features")
+
+        # Rebuild the constituents as views into the packed arrays
+        ends = np.append(learner.roots[1:], len(learner.feature))
+        for i, (start, end) in enumerate(zip(learner.roots, ends)):
+            tree = learner.learner_type(**learner.parameters)
+            for name in NODE_ARRAYS:
+                setattr(tree, name, arrays[name][start:end])
+            learner.learners[i] = tree
+        learner._link()
+        return learner
+
+    def test_bags(self, x):
+        """Predictions of every bag as a (bags, rows) matrix"""
+
+        if self.roots is None:
+            y = np.zeros((self.bags, len(x)))
+            for i in range(self.bags):
+                predictions = self.learners[i].test(x)
+                y[i] = predictions
+            return y
+
+        # Score in row chunks so the (tree, row) pairs stay within memory limits
+        x = np.ascontiguousarray(x)
+        chunk = max(1, MAX_PACKED_PAIRS // self.bags)
+        y = np.zeros((self.bags, len(x)))
+        for start in range(0, len(x), chunk):
+            y[:, start:start + chunk] = self._test_packed(x[start:start + chunk])
+        return y
+
+    def _test_packed(self, x):
+
+        # Every (tree, row) pair starts at its tree's root and all pairs step down together. Pairs at a leaf loop
+        # in place, so finished pairs are only written out and dropped once they make up half of the working arrays
+        num_rows, num_features = x.shape
+        flat_x = x.ravel()
+        nodes = np.repeat(self.roots, num_rows)
+        row_starts = np.tile(np.arange(num_rows) * num_features, self.bags)
+        pairs = np.arange(len(nodes))
+        y = np.empty(len(nodes))
+        step = 0
+        while len(pairs) > 0:
+            step += 1
+            if step % 2 == 0:
+                at_leaf = self.feature[nodes] < 0
+                finished = np.count_nonzero(at_leaf)
+                if 2 * finished >= len(pairs):
+                    y[pairs[at_leaf]] = self.y_val[nodes[at_leaf]]
+                    keep = ~at_leaf
+                    pairs, nodes, row_starts = pairs[keep], nodes[keep], row_starts[keep]
+                    continue
+            go_left = flat_x[row_starts + self.step_feature[nodes]] <= self.split_val[nodes]
+            nodes = self.children[2 * nodes + 1 - go_left]
+        return y.reshape(self.bags, num_rows)
 
     def test(self, x):
 
         # return predictions (estimates) for each row of x
-        y = np.zeros((self.bags, len(x)))
-        for i in range(self.bags):
-            predictions = self.learners[i].test(x)
-            y[i] = predictions
-        return y.mean(axis=0)
+        return self.test_bags(x).mean(axis=0)
+
+    def test_prefix(self, x):
+        """Running ensemble predictions, row k - 1 is the mean of the first k bags
+
+        One scoring pass gives the predictions of every smaller forest, e.g. for a sweep over bag counts
+        """
+
+        y = np.cumsum(self.test_bags(x), axis=0)
+        return y / np.arange(1, self.bags + 1)[:, None]
+
+    def oob_prefix(self, x):
+        """Running out of bag predictions, row k - 1 estimates each training row with the first k bags that left it out
+
+        Like test_prefix, one scoring pass gives the out of bag estimates of every smaller forest.
+        x must be the training data in the same row order, rows sampled by each of the first k bags are NaN in row k - 1
+        """
+
+        if self.in_bag is None or len(x) != self.in_bag.shape[1]:
+            raise ValueError("Out of bag predictions need the training data the learner was trained on")
+        out_of_bag = ~self.in_bag
+        totals = np.cumsum(np.where(out_of_bag, self.test_bags(x), 0), axis=0)
+        counts = np.cumsum(out_of_bag, axis=0)
+        predictions = np.full(totals.shape, np.nan)
+        np.divide(totals, counts, out=predictions, where=counts > 0)
+        return predictions
+
+    def oob_predictions(self, x):
+        """Estimate each training row with only the bags that left it out
+
+        x must be the training data in the same row order, rows sampled by every bag are NaN
+        """
+        return self.oob_prefix(x)[-1]
+
+    def oob_score(self, x, y):
+        """Out of bag RMSE, correlation and R^2 over the training rows with an estimate"""
+
+        predictions = self.oob_predictions(x)
+        has_estimate = ~np.isnan(predictions)
+        y = np.asarray(y, dtype=np.float64)[has_estimate]
+        predictions = predictions[has_estimate]
+        residuals = y - predictions
+        rmse = np.sqrt(np.mean(residuals ** 2))
+        correlation = np.corrcoef(y, predictions)[0, 1]
+        r_squared = 1 - np.sum(residuals ** 2) / np.sum((y - y.mean()) ** 2)
+        return rmse, correlation, r_squared
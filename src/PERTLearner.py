@@ -1,70 +1,146 @@
 import numpy as np
 
+from model_io import save_arrays, load_arrays
+
+NODE_ARRAYS = ["feature", "split_val", "y_val", "left", "right"]
+
 
 class PERTLearner:
+    """Perfect random tree stored as flat node arrays
+
+    Node i splits on feature[i] at split_val[i] and sends rows to left[i] or right[i].
+    Leaves are marked with feature[i] == -1 and hold their estimate in y_val[i].
+    seed is anything np.random.default_rng accepts, the same seed always grows the same tree.
+    """
 
-    def __init__(self):
+    def __init__(self, seed=None):
+        self.seed = seed
         self.feature = None
         self.split_val = None
         self.y_val = None
         self.left = None
         self.right = None
+        self.n_features = None
+        self.features = None
 
     def train(self, x, y):
 
+        rng = np.random.default_rng(self.seed)
         num_rows, num_features = x.shape
-        a = b = 0
-        tries = 0
-        while a == b:
-
-            # Select random feature
-            self.feature = np.random.randint(0, num_features - 1)
-
-            # Select 2 random rows and get value at feature
-            w, z = np.random.randint(0, num_rows, size=2)
-            a, b = x[w, self.feature], x[z, self.feature]
-            tries += 1
-
-            # If unable to find valid split after 10 tries, return leaf
+        self.n_features = num_features
+        feature, split_val, y_val, left, right = [], [], [], [], []
+
+        # Every node owns a slice idx[lo:hi] of one row permutation, which is partitioned in place
+        # as the tree grows so x and y are never copied. Popping left before right numbers nodes in preorder.
+        idx = np.arange(num_rows)
+        stack = [(0, num_rows, -1, left)]
+        while stack:
+            lo, hi, parent, children = stack.pop()
+            node = len(feature)
+            if parent >= 0:
+                children[parent] = node
+            rows = idx[lo:hi]
+
+            a = b = 0
+            tries = 0
+            while a == b and tries < 10:
+
+                # Select random feature
+                split_feature = rng.integers(0, num_features - 1)
+
+                # Select 2 random rows and get value at feature
+                w, z = rng.integers(0, hi - lo, size=2)
+                a, b = x[rows[w], split_feature], x[rows[z], split_feature]
+                tries += 1
+
+            # If unable to find valid split after 10 tries, make a leaf
             if tries == 10:
-                leaf = PERTLearner()
-                leaf.y_val = np.mean(y)
-                return leaf
-
-        # Get split val from valid a and b values
-        self.split_val = (.5 * a) + (.5 * b)
-
-        # Recurse with child leafs using a mask to split the data
-        feature_col = x[:, self.feature]
-        mask = feature_col <= self.split_val
-        left = PERTLearner()
-        right = PERTLearner()
-        self.left = left.train(x[mask], y[mask])
-        self.right = right.train(x[~mask], y[~mask])
+                feature.append(-1)
+                split_val.append(np.nan)
+                y_val.append(np.mean(y[rows]))
+                left.append(-1)
+                right.append(-1)
+                continue
+
+            # Get split val from valid a and b values
+            split = (.5 * a) + (.5 * b)
+            feature.append(split_feature)
+            split_val.append(split)
+            y_val.append(np.nan)
+            left.append(-1)
+            right.append(-1)
+
+            # Stable partition of this node's rows, left side first
+            mask = x[rows, split_feature] <= split
+            left_rows, right_rows = rows[mask], rows[~mask]
+            mid = lo + len(left_rows)
+            idx[lo:mid] = left_rows
+            idx[mid:hi] = right_rows
+            stack.append((mid, hi, node, right))
+            stack.append((lo, mid, node, left))
+
+        # Freeze the lists into compact arrays
+        self.feature = np.array(feature, dtype=np.int32)
+        self.split_val = np.array(split_val, dtype=np.float64)
+        self.y_val = np.array(y_val, dtype=np.float64)
+        self.left = np.array(left, dtype=np.int32)
+        self.right = np.array(right, dtype=np.int32)
         return self
 
     def query(self, x):
 
-        if self.y_val:
-            return self.y_val
-
-        if x[self.feature] <= self.split_val:
-            return self.left.query(x)
-        else:
-            return self.right.query(x)
+        # Walk from the root until a leaf is reached
+        node = 0
+        while self.feature[node] >= 0:
+            if x[self.feature[node]] <= self.split_val[node]:
+                node = self.left[node]
+            else:
+                node = self.right[node]
+        return self.y_val[node]
 
     def test(self, x):
 
         # return predictions (estimates) for each row of x
-        num_rows = len(x)
-        y = np.zeros(num_rows)
-        for i in range(num_rows):
-            pred = self.query(x[i])
-            y[i] = pred
-        return y
+        # Rows move down the tree together, one level per step, until all reach a leaf
+        x = np.asarray(x)
+        nodes = np.zeros(len(x), dtype=np.int32)
+        active = np.flatnonzero(self.feature[nodes] >= 0)
+        while len(active) > 0:
+            current = nodes[active]
+            go_left = x[active, self.feature[current]] <= self.split_val[current]
+            nodes[active] = np.where(go_left, self.left[current], self.right[current])
+            active = active[self.feature[nodes[active]] >= 0]
+        return self.y_val[nodes]
+
+    def save(self, path, features=None):
+        """Save the trained tree's node arrays and, if given, the names of its input columns to a model file"""
+
+        features = self.features if features is None else list(features)
+        if features is not None and len(features) != self.n_features:
+            raise ValueError(f"{len(features)} feature names for a tree trained on {self.n_features} features")
+        meta = {"model": "PERTLearner", "n_features": self.n_features, "features": features}
+        save_arrays(path, {name: getattr(self, name) for name in NODE_ARRAYS}, meta)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a tree saved with save, memory-mapped unless mmap is False"""
+
+        arrays, meta = load_arrays(path, mmap=mmap)
+        if meta["model"] != "PERTLearner":
+            raise ValueError(f"{path} holds a {meta['model']}, not a PERTLearner")
+        learner = cls()
+        for name in NODE_ARRAYS:
+            setattr(learner, name, arrays[name])
+        learner.n_features = meta.get("n_features")
+        learner.features = meta.get("features")
+        return learner
+
+    def _describe(self, node):
+        if self.feature[node] < 0:
+            return f"Leaf Node with val = {self.y_val[node]}"
+        else:
+            return (f"Branch Feature: {self.feature[node]} @ {self.split_val[node]}"
+                    f"\n\t{self._describe(self.left[node])}\n\t{self._describe(self.right[node])}")
 
     def __repr__(self) -> str:
-        if self.y_val:
-            return f"Leaf Node with val = {self.y_val}"
-        else:
-            return f"Branch Feature: {self.feature} @ {self.split_val}\n\t{self.left}\n\t{self.right}"
+        return self._describe(0)
@@ -13,13 +13,24 @@
 import requests
 from requests_oauthlib import OAuth1
 from dotenv import load_dotenv
-from datetime import datetime
+import functools
+import hashlib
 import os
 import json
+import time
+from datetime import datetime
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from bricklink import iter_current_prices, fetch_price_guide, parse_price_guide
+from brickset import fetch_sets, iter_query_sets
+from brickset_parser import PRICE_SCHEMA, parse_sets
+from checkpoint import Checkpoint
+from http_cache import CacheMiss, CachedSession, default_cache
+from price_history import PriceHistory
+from quota import QuotaExhausted, QuotaScheduler
+
 
 # Load environment variables
 dotenv_path = os.path.join(os.path.dirname(__file__), '../.env')
@@ -37,6 +48,23 @@ CONSUMER_SECRET = os.getenv('CONSUMER_SECRET')
 BS_API_KEY = os.environ.get('BS_API_KEY')
 BS_USERNAME = os.environ.get('BS_USERNAME')
 BS_PASSWORD = os.environ.get('BS_PASSWORD')
+BS_DAILY_LIMIT = int(os.environ.get('BS_DAILY_LIMIT', 100))  # getSets calls per day
+
+# Every API call reads through the local response cache, see http_cache.py
+session = CachedSession()
+
+
+@functools.lru_cache(maxsize=None)
+def brickset_quota():
+    """Daily getSets budget, shared through the quota ledger by every run using this key"""
+    key_hash = hashlib.sha1(str(BS_API_KEY).encode()).hexdigest()[:12]  # Each API key has its own budget
+    return QuotaScheduler(f"brickset:{key_hash}:getSets", daily_limit=BS_DAILY_LIMIT, rate=1, burst=5)
+
+
+@functools.lru_cache(maxsize=None)
+def brickset_session():
+    """Cached session whose getSets calls go through the quota scheduler"""
+    return CachedSession(brickset_quota().session(requests, endpoints={"getSets"}))
 
 
 def get_user_hash(username, password):
@@ -50,8 +78,11 @@ def get_user_hash(username, password):
         "password": password
     }
 
-    # Send the API request
-    response = requests.get(api_endpoint, params=params)
+    # Send the API request, the hash is never cached and offline replays don't need it (cache keys leave it out)
+    try:
+        response = session.get(api_endpoint, params=params)
+    except CacheMiss:
+        return None
 
     # Return the price
     return response.json()["hash"]
@@ -71,39 +102,19 @@ def get_prices_by_year(year, df, user_hash):
     }
 
     # Send the API request
-    response = requests.get(api_endpoint, params=params)
+    response = brickset_session().get(api_endpoint, params=params)
     response = response.json()
     if "message" in response:
         print("API Limit Exceeded")
         return None
 
-    # Lots more features in here if we need it
+    # Lots more features in here if we need it, see brickset_parser.py
     try:
-        sets = response["sets"]
-        for set in sets:
-            set_number = set["number"]
-            set_name = set["name"]
-            set_year = set["year"]
-            set_theme = set["theme"] if "theme" in set else np.nan
-            set_subtheme = set["subtheme"] if "subtheme" in set else np.nan
-            set_pieces = set["pieces"] if "pieces" in set else np.nan
-            set_minifigs = set["minifigs"] if "minifigs" in set else np.nan
-            try:
-                price = set["LEGOCom"]["US"]["retailPrice"]
-            except Exception as e:
-                print(f"Could not find price for {set_number} -- {e}")
-                price = np.nan
-            row = {
-                "Item_Number": set_number,
-                "Name": set_name,
-                "Year": set_year,
-                "Theme": set_theme,
-                "Subtheme": set_subtheme,
-                "Pieces": set_pieces,
-                "Minifigures": set_minifigs,
-                "USD_MSRP": price,
-            }
-            df = df.append(row, ignore_index=True)
+        year_df = parse_sets(response["sets"], PRICE_SCHEMA, with_id=False)
+        missing = year_df["USD_MSRP"].isna().sum()
+        if missing:
+            print(f"Could not find price for {missing} sets from {year}")
+        df = pd.concat([df, year_df], ignore_index=True)
 
     except Exception as e:
         print(f"Could not find matches for {year} -- {e}")
@@ -126,7 +137,7 @@ def get_historical_price(set_id, user_hash):
     }
 
     # Send the API request
-    response = requests.get(api_endpoint, params=params)
+    response = brickset_session().get(api_endpoint, params=params)
     response = response.json()
     # Lots more features in here if we need it
     try:
@@ -139,60 +150,92 @@ def get_historical_price(set_id, user_hash):
     return historical_price
 
 
-def get_current_price(set_id):
-    """Use Bricklink API to get the historical price of a set"""
-
-    # Set the API endpoint and parameters
-    api_endpoint = f"https://api.bricklink.com/api/store/v1/items/SET/{set_id}/price"
-    oauth = OAuth1(
+def get_bricklink_auth():
+    """OAuth1 signer for the Bricklink API, one can be reused for every request"""
+    return OAuth1(
         client_key=CONSUMER_KEY,
         client_secret=CONSUMER_SECRET,
         resource_owner_key=BL_API_TOKEN,
         resource_owner_secret=BL_API_SECRET,
     )
-    params = {
-        "guide_type": "sold",  # sold (closed) or stock (active listings)
-        "no": set_id,
-        "new_or_used": "N",
-        "currency_code": "USD",
-        "region": "north_america",
-    }
 
-    # Send the API request
-    response = requests.get(api_endpoint, auth=oauth, params=params)
-    response = response.json()
-    try:
-        quantity = response["data"]["total_quantity"] if "total_quantity" in response["data"] else np.nan
-    except Exception as e:
-        quantity = np.nan
 
-    try:
-        # Get most recent order for price
-        orders = response["data"]["price_detail"]
-        most_recent_date = datetime.min
-        most_recent_order = None
-        for order in orders:
-            date = datetime.strptime(order["date_ordered"], "%Y-%m-%dT%H:%M:%S.%fZ")
-            if date > most_recent_date:
-                most_recent_date = date
-                most_recent_order = order
+def get_current_price(set_id):
+    """Use Bricklink API to get the historical price of a set"""
+
+    # Send the API request
+    response = fetch_price_guide(set_id, session, get_bricklink_auth())
+    price, quantity = parse_price_guide(response)
+    if np.isnan(price):
+        print(f"Uh oh could not find a price for {set_id} (probably resource couldn't be found)")
+    else:
         print(f"{set_id} Found Set")
-        return most_recent_order["unit_price"], quantity
-    except Exception as e:
-        print(f"Uh oh exception: {e} for {set_id} (probably resource couldn't be found)")
-        return np.nan, quantity
+    return price, quantity
+
 
+def price_max_age(df, year=None):
+    """Days a fetched price stays fresh for each set
 
-def get_all_current_prices(df):
-    """Get all current prices for all sets in the database"""
+    Sets from the last few years and heavily traded sets move the most, retired and thinly traded ones barely move.
+    """
+    age = (year or datetime.now().year) - df["Year"].to_numpy()
+    volume = df["Total_Quantity"].fillna(0).to_numpy() if "Total_Quantity" in df else np.zeros(len(df))
+    return pd.Series(np.select([age <= 2, volume >= 100], [7, 30], default=90), index=df.index)
+
+
+def get_all_current_prices(df, max_workers=8, rate_limit=None, checkpoint_path="custom_8_checkpoint.sqlite",
+                           refresh=False, max_age=price_max_age, history=None):
+    """Get all current prices for all sets in the database
+
+    Fetches up to max_workers sets at a time over one pooled session, at most rate_limit requests per second.
+    Every fetched order is kept in history, the PriceHistory store by default. Prices are checkpointed with their
+    fetch time every 500 sets (and when the run stops for any reason), always after their orders are flushed to
+    history, so rerunning after a crash only fetches the missing sets and never skips a set whose orders were lost.
+    With refresh, sets last fetched more than max_age(df) days ago are fetched again as well.
+    Only fetched sets are updated in df and an empty fetch never replaces a known price. Failed fetches are
+    retried on the next run.
+    """
 
-    df["Total_Quantity"] = np.nan
-    df["Current_Price"] = np.nan
-    for i in range(len(df)):
-        set_id = df["Set_ID"][i]
-        current_price, total_quantity = get_current_price(set_id)
-        df.loc[i, "Current_Price"] = current_price
-        df.loc[i, "Total_Quantity"] = total_quantity
+    checkpoint = Checkpoint(checkpoint_path)
+    history = PriceHistory() if history is None else history
+    fetched_at = df["Set_ID"].map(checkpoint.done_at()).astype(float)
+    stale = fetched_at.isna()
+    if refresh:
+        stale |= (time.time() - fetched_at) / (24 * 60 * 60) > max_age(df)
+    todo = df.loc[stale, "Set_ID"].tolist()
+    print(f"{len(df) - len(todo)} sets fresh, {len(todo)} to fetch")
+    rows, done = [], []
+
+    def save():
+        # Orders first, then the prices and done marks, in batches since a flush rewrites whole year partitions
+        history.flush()
+        checkpoint.record(rows, done=done)
+        rows.clear()
+        done.clear()
+
+    try:
+        for set_id, current_price, total_quantity in iter_current_prices(todo, get_bricklink_auth(),
+                                                                         max_workers=max_workers,
+                                                                         rate_limit=rate_limit,
+                                                                         cache=default_cache(), history=history):
+            if current_price is None:
+                continue
+            if pd.notna(current_price) or pd.notna(total_quantity):
+                rows.append({"Set_ID": set_id, "Total_Quantity": total_quantity, "Current_Price": current_price})
+            done.append(set_id)
+            if len(done) >= 500:
+                save()
+    finally:
+        save()
+
+    # Bulk export the checkpoint and upsert it into the data set
+    prices = checkpoint.export(["Set_ID", "Total_Quantity", "Current_Price"]).set_index("Set_ID")
+    checkpoint.close()
+    for column in ["Total_Quantity", "Current_Price"]:
+        if column not in df:
+            df[column] = np.nan
+        fresh = df["Set_ID"].map(prices[column])
+        df[column] = fresh.where(fresh.notna(), df[column])
 
     df.to_csv("custom_8.csv", index=False)
 
@@ -204,9 +247,13 @@ def get_all_list_prices(df):
     - got 788 prices
     - only 175 overlapped with current trades
     However it was used to fill in the gaps from the other data source
+
+    Years missing the most list prices are fetched first, and the run pauses through the daily quota reset.
     """
     user_hash = get_user_hash(BS_USERNAME, BS_PASSWORD)
-    for year in range(2016, 2024):
+    missing = df[df["USD_MSRP"].isna()] if "USD_MSRP" in df else df
+    missing = missing.groupby("Year").size()
+    for year in brickset_quota().order(range(2016, 2024), lambda year: -missing.get(year, 0)):
         df = get_prices_by_year(year, df, user_hash)
         if df is None:
             print(f"API LIMIT REACHED: stopped at {year}")
@@ -217,86 +264,16 @@ def get_all_list_prices(df):
 
 
 def get_data_by_year(year, df, user_hash):
+    """Append every set from year to df, fetching all pages of the year concurrently, None if the API limit is hit"""
 
-    # Set the API endpoint and parameters
-    api_endpoint = "https://brickset.com/api/v3.asmx/getSets"
-    params = {
-        "apiKey": BS_API_KEY,
-        "userHash": user_hash,
-        "params": json.dumps({
-            "year": year,
-            "pageSize": 500,
-        })
-    }
-
-    # Send the API request
-    response = requests.get(api_endpoint, params=params)
-    response = response.json()
-    # response = {'status': 'success', 'matches': 45, 'sets': [{'setID': 5261, 'number': '75', 'numberVariant': 1, 'name': 'PreSchool Set', 'year': 1975, 'theme': 'PreSchool', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 16, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/75-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/75-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/75-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 10, 'wantedBy': 28}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-05T13:20:02.207Z'}, {'setID': 5262, 'number': '77', 'numberVariant': 1, 'name': 'PreSchool Set', 'year': 1975, 'theme': 'PreSchool', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 20, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/77-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/77-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/77-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 11, 'wantedBy': 27}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2012-02-15T05:09:21.747Z'}, {'setID': 30975, 'number': '077', 'numberVariant': 1, 'name': 'Pre-School Set', 'year': 1975, 'theme': 'Duplo', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 21, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/077-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/077-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/077-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 10, 'wantedBy': 6}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 1, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2020-11-17T08:17:05.9Z'}, {'setID': 5263, 'number': '78', 'numberVariant': 1, 'name': 'PreSchool Set', 'year': 1975, 'theme': 'PreSchool', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 32, 'image': {}, 'bricksetURL': 'https://brickset.com/sets/78-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 8, 'wantedBy': 25}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2005-12-27T02:22:05Z'}, {'setID': 22707, 'number': '78', 'numberVariant': 3, 'name': 'Basic Set', 'year': 1975, 'theme': 'Samsonite', 'themeGroup': 'Vintage', 'subtheme': 'Basic set', 'category': 'Normal', 'released': True, 'pieces': 330, 'image': {}, 'bricksetURL': 'https://brickset.com/sets/78-3', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 10, 'wantedBy': 28}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2013-04-11T00:00:00Z'}, {'setID': 7985, 'number': '133', 'numberVariant': 1, 'name': 'Locomotive', 'year': 1975, 'theme': 'Trains', 'themeGroup': 'Modern day', 'subtheme': '4.5/12V', 'category': 'Normal', 'released': True, 'pieces': 87, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/133-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/133-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/133-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 279, 'wantedBy': 180}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-05T16:23:50.93Z'}, {'setID': 252, 'number': '134', 'numberVariant': 1, 'name': 'Mobile Crane and Wagon', 'year': 1975, 'theme': 'Trains', 'themeGroup': 'Modern day', 'subtheme': '4.5/12V', 'category': 'Normal', 'released': True, 'pieces': 86, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/134-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/134-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/134-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 252, 'wantedBy': 179}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-06T11:48:49.187Z'}, {'setID': 261, 'number': '136', 'numberVariant': 1, 'name': 'Tanker Wagon', 'year': 1975, 'theme': 'Trains', 'themeGroup': 'Modern day', 'subtheme': '4.5/12V', 'category': 'Normal', 'released': True, 'pieces': 83, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/136-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/136-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/136-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 404, 'wantedBy': 199}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-06T11:50:24.907Z'}, {'setID': 7437, 'number': '137', 'numberVariant': 2, 'name': 'Passenger Sleeping Car', 'year': 1975, 'theme': 'Trains', 'themeGroup': 'Modern day', 'subtheme': '4.5/12V', 'category': 'Normal', 'released': True, 'pieces': 82, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/137-2.jpg', 'imageURL': 'https://images.brickset.com/sets/images/137-2.jpg'}, 'bricksetURL': 'https://brickset.com/sets/137-2', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 299, 'wantedBy': 177}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-06T11:53:47.633Z'}, {'setID': 352, 'number': '148', 'numberVariant': 1, 'name': 'Station', 'year': 1975, 'theme': 'Trains', 'themeGroup': 'Modern day', 'subtheme': '4.5/12V', 'category': 'Normal', 'released': True, 'pieces': 293, 'minifigs': 5, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/148-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/148-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/148-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 479, 'wantedBy': 300}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 1, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-06T12:04:57.743Z'}, {'setID': 608, 'number': '182', 'numberVariant': 1, 'name': 'Train Set with Motor', 'year': 1975, 'theme': 'Trains', 'themeGroup': 'Modern day', 'subtheme': '4.5/12V', 'category': 'Normal', 'released': True, 'pieces': 369, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/182-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/182-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/182-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 409, 'wantedBy': 211}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 1, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-06T14:10:46.62Z'}, {'setID': 5244, 'number': '190', 'numberVariant': 1, 'name': 'Farm Set', 'year': 1975, 'theme': 'Building Set with People', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 526, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/190-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/190-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/190-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 223, 'wantedBy': 127}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 1, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2005-12-15T23:56:27Z'}, {'setID': 5269, 'number': '195', 'numberVariant': 1, 'name': 'Airplane', 'year': 1975, 'theme': 'Building Set with People', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 89, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/195-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/195-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/195-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 145, 'wantedBy': 82}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2011-08-31T14:24:03.84Z'}, {'setID': 828, 'number': '222', 'numberVariant': 1, 'name': 'Building Ideas Book', 'year': 1975, 'theme': 'Books', 'themeGroup': 'Miscellaneous', 'subtheme': 'LEGO', 'category': 'Book', 'released': True, 'pieces': 1, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/222-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/222-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/222-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 695, 'wantedBy': 122}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2020-11-10T14:14:47.43Z'}, {'setID': 931, 'number': '253', 'numberVariant': 2, 'name': 'Helicopter and Pilot', 'year': 1975, 'theme': 'Building Set with People', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 49, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/253-2.jpg', 'imageURL': 'https://images.brickset.com/sets/images/253-2.jpg'}, 'bricksetURL': 'https://brickset.com/sets/253-2', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 204, 'wantedBy': 76}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 2, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-07T12:13:51.407Z'}, {'setID': 7438, 'number': '254', 'numberVariant': 1, 'name': 'Family', 'year': 1975, 'theme': 'Building Set with People', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 103, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/254-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/254-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/254-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 264, 'wantedBy': 80}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-07T12:18:28.19Z'}, {'setID': 7439, 'number': '255', 'numberVariant': 2, 'name': 'Farming Scene', 'year': 1975, 'theme': 'Building Set with People', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 120, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/255-2.jpg', 'imageURL': 'https://images.brickset.com/sets/images/255-2.jpg'}, 'bricksetURL': 'https://brickset.com/sets/255-2', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 134, 'wantedBy': 84}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-07T12:23:04.46Z'}, {'setID': 6539, 'number': '362', 'numberVariant': 1, 'name': 'Windmill', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 215, 'minifigs': 2, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/362-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/362-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/362-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 280, 'wantedBy': 189}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 2, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T12:00:57.94Z'}, {'setID': 6368, 'number': '363', 'numberVariant': 1, 'name': 'Hospital', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 229, 'minifigs': 7, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/363-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/363-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/363-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 641, 'wantedBy': 237}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 4.2, 'reviewCount': 3, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T12:04:04.65Z'}, {'setID': 7440, 'number': '364', 'numberVariant': 1, 'name': 'Harbour', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 518, 'minifigs': 7, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/364-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/364-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/364-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 188, 'wantedBy': 215}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T12:05:48.943Z'}, {'setID': 7441, 'number': '365', 'numberVariant': 1, 'name': 'Wild West', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 602, 'minifigs': 8, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/365-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/365-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/365-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 255, 'wantedBy': 226}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 1, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T15:27:54.237Z'}, {'setID': 6023, 'number': '367', 'numberVariant': 1, 'name': 'Space Module with Astronauts', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 364, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/367-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/367-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/367-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 597, 'wantedBy': 331}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 3.7, 'reviewCount': 3, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T15:30:00.12Z'}, {'setID': 6024, 'number': '390', 'numberVariant': 2, 'name': '1913 Cadillac', 'year': 1975, 'theme': 'Hobby Set', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 200, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/390-2.jpg', 'imageURL': 'https://images.brickset.com/sets/images/390-2.jpg'}, 'bricksetURL': 'https://brickset.com/sets/390-2', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 762, 'wantedBy': 454}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 3.9, 'reviewCount': 2, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T16:09:29.21Z'}, {'setID': 6025, 'number': '391', 'numberVariant': 1, 'name': '1926 Renault', 'year': 1975, 'theme': 'Hobby Set', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 237, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/391-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/391-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/391-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 609, 'wantedBy': 461}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 4.3, 'reviewCount': 2, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T16:10:48.28Z'}, {'setID': 6026, 'number': '392', 'numberVariant': 1, 'name': 'Formula 1', 'year': 1975, 'theme': 'Hobby Set', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 197, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/392-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/392-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/392-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 443, 'wantedBy': 378}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 2, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-10T16:12:36.88Z'}, {'setID': 5275, 'number': '430', 'numberVariant': 1, 'name': 'Biplane', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 18, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/430-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/430-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/430-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 454, 'wantedBy': 116}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 4.0, 'reviewCount': 5, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2012-07-04T11:02:13.287Z'}, {'setID': 5276, 'number': '480', 'numberVariant': 1, 'name': 'Rescue Helicopter', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 62, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/480-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/480-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/480-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 410, 'wantedBy': 120}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T10:28:11.397Z'}, {'setID': 5278, 'number': '490', 'numberVariant': 1, 'name': 'Mobile Crane', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 46, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/490-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/490-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/490-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 383, 'wantedBy': 110}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T10:30:56.48Z'}, {'setID': 7443, 'number': '516', 'numberVariant': 1, 'name': 'Bricks and half bricks', 'year': 1975, 'theme': 'Duplo', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 20, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/516-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/516-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/516-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 17, 'wantedBy': 24}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Promotional', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T10:39:53.813Z'}, {'setID': 7444, 'number': '517', 'numberVariant': 1, 'name': 'Bricks and half bricks and arches', 'year': 1975, 'theme': 'Duplo', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 121, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/517-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/517-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/517-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 29, 'wantedBy': 25}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2010-04-05T04:11:20.013Z'}, {'setID': 7445, 'number': '518', 'numberVariant': 8, 'name': 'Bricks and half bricks and trolley', 'year': 1975, 'theme': 'Duplo', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 17, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/518-8.jpg', 'imageURL': 'https://images.brickset.com/sets/images/518-8.jpg'}, 'bricksetURL': 'https://brickset.com/sets/518-8', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 24, 'wantedBy': 24}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T10:45:11.34Z'}, {'setID': 7446, 'number': '519', 'numberVariant': 8, 'name': 'Bricks and half bricks and arches and trolley', 'year': 1975, 'theme': 'Duplo', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 240, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/519-8.jpg', 'imageURL': 'https://images.brickset.com/sets/images/519-8.jpg'}, 'bricksetURL': 'https://brickset.com/sets/519-8', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 21, 'wantedBy': 27}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T10:49:08.52Z'}, {'setID': 7447, 'number': '520', 'numberVariant': 9, 'name': 'Bricks and half bricks and two tolleys', 'year': 1975, 'theme': 'Duplo', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 168, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/520-9.jpg', 'imageURL': 'https://images.brickset.com/sets/images/520-9.jpg'}, 'bricksetURL': 'https://brickset.com/sets/520-9', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 24, 'wantedBy': 27}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T10:51:38.1Z'}, {'setID': 7449, 'number': '521', 'numberVariant': 8, 'name': 'Bricks and half bricks all colours', 'year': 1975, 'theme': 'Duplo', 'themeGroup': 'Pre-school', 'category': 'Normal', 'released': True, 'pieces': 640, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/521-8.jpg', 'imageURL': 'https://images.brickset.com/sets/images/521-8.jpg'}, 'bricksetURL': 'https://brickset.com/sets/521-8', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 29, 'wantedBy': 25}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T10:53:03.463Z'}, {'setID': 5284, 'number': '580', 'numberVariant': 1, 'name': 'Brick Yard', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 216, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/580-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/580-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/580-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 368, 'wantedBy': 137}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 1, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2012-07-04T11:02:31.46Z'}, {'setID': 6174, 'number': '615', 'numberVariant': 2, 'name': 'Forklift', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'subtheme': 'Vehicle', 'category': 'Normal', 'released': True, 'pieces': 21, 'minifigs': 1, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/615-2.jpg', 'imageURL': 'https://images.brickset.com/sets/images/615-2.jpg'}, 'bricksetURL': 'https://brickset.com/sets/615-2', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 1019, 'wantedBy': 140}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 2, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T11:42:10.19Z'}, {'setID': 5098, 'number': '659', 'numberVariant': 1, 'name': 'Police Patrol', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 49, 'minifigs': 2, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/659-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/659-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/659-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 953, 'wantedBy': 154}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 3.7, 'reviewCount': 2, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T13:25:38.917Z'}, {'setID': 5107, 'number': '660', 'numberVariant': 1, 'name': 'Air Transporter', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 39, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/660-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/660-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/660-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 706, 'wantedBy': 137}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 1, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T13:28:24.653Z'}, {'setID': 5099, 'number': '692', 'numberVariant': 1, 'name': 'Road Repair Crew', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 57, 'minifigs': 2, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/692-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/692-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/692-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 486, 'wantedBy': 122}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2013-02-24T14:09:17.51Z'}, {'setID': 5095, 'number': '693', 'numberVariant': 1, 'name': 'Fire engine with firemen', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 62, 'minifigs': 3, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/693-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/693-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/693-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 533, 'wantedBy': 134}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {'min': 6}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2023-02-25T15:02:51.853Z'}, {'setID': 6700, 'number': '694', 'numberVariant': 1, 'name': 'Transport Truck', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'subtheme': 'Vehicle', 'category': 'Normal', 'released': True, 'pieces': 65, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/694-1.jpg', 'imageURL': 'https://images.brickset.com/sets/images/694-1.jpg'}, 'bricksetURL': 'https://brickset.com/sets/694-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 475, 'wantedBy': 148}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-12T13:51:30.433Z'}, {'setID': 5231, 'number': '760', 'numberVariant': 2, 'name': 'London Bus', 'year': 1975, 'theme': 'LEGOLAND', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 110, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/760-2.jpg', 'imageURL': 'https://images.brickset.com/sets/images/760-2.jpg'}, 'bricksetURL': 'https://brickset.com/sets/760-2', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 404, 'wantedBy': 233}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 2, 'packagingType': '{Not specified}', 'availability': '{Not specified}', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2017-01-09T08:28:54.11Z'}, {'setID': 7442, 'number': '814', 'numberVariant': 2, 'name': 'Tractor', 'year': 1975, 'theme': 'Building Set with People', 'themeGroup': 'Vintage', 'category': 'Normal', 'released': True, 'pieces': 93, 'image': {'thumbnailURL': 'https://images.brickset.com/sets/small/814-2.jpg', 'imageURL': 'https://images.brickset.com/sets/images/814-2.jpg'}, 'bricksetURL': 'https://brickset.com/sets/814-2', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 138, 'wantedBy': 101}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2021-05-13T11:40:14.107Z'}, {'setID': 9532, 'number': 'BB173', 'numberVariant': 1, 'name': 'Holdall Storage Bag', 'year': 1975, 'theme': 'Gear', 'themeGroup': 'Miscellaneous', 'subtheme': 'Storage', 'category': 'Gear', 'released': True, 'image': {}, 'bricksetURL': 'https://brickset.com/sets/BB173-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 11, 'wantedBy': 27}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Box', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2012-03-31T08:01:46.14Z'}, {'setID': 9361, 'number': 'SUPSET1', 'numberVariant': 1, 'name': 'Super Set', 'year': 1975, 'theme': 'Universal Building Set', 'themeGroup': 'Basic', 'category': 'Other', 'released': True, 'image': {}, 'bricksetURL': 'https://brickset.com/sets/SUPSET1-1', 'collection': {'owned': False, 'wanted': False, 'qtyOwned': 0, 'rating': 0, 'notes': ''}, 'collections': {'ownedBy': 15, 'wantedBy': 37}, 'LEGOCom': {'US': {}, 'UK': {}, 'CA': {}, 'DE': {}}, 'rating': 0.0, 'reviewCount': 0, 'packagingType': 'Other', 'availability': 'Retail', 'instructionsCount': 0, 'additionalImageCount': 0, 'ageRange': {}, 'dimensions': {}, 'barcode': {}, 'extendedData': {}, 'lastUpdated': '2012-02-18T08:16:31.683Z'}]}
-    if "message" in response:
+    try:
+        sets = fetch_sets({"year": year}, BS_API_KEY, user_hash, quota=brickset_quota())
+    except QuotaExhausted:
         print("API Limit Exceeded")
         return None
 
-    # Lots more features in here if we need it
     try:
-        sets = response["sets"]
-        rows = []
-        for set in sets:
-
-            # Id / Number
-            set_number = set["number"]
-            set_var = set["numberVariant"]
-            set_id = f"{set_number}-{set_var}"
-
-            # Basic common info
-            set_name = set["name"]
-            set_year = set["year"]
-            set_pieces = set["pieces"] if "pieces" in set else np.nan
-            set_minifigs = set["minifigs"] if "minifigs" in set else np.nan
-            set_packaging = set["packagingType"] if "packagingType" in set else np.nan
-            set_rating = set["rating"] if "rating" in set else np.nan
-            set_availability = set["availability"] if "availability" in set else np.nan
-            set_num_instructions = set["instructionsCount"] if "instructionsCount" in set else np.nan
-
-            # Theme
-            set_theme = set["theme"] if "theme" in set else np.nan
-            set_theme_group = set["themeGroup"] if "themeGroup" in set else np.nan
-            set_subtheme = set["subtheme"] if "subtheme" in set else np.nan
-            set_category = set["category"] if "category" in set else np.nan
-
-            # Num Owned
-            try:
-                num_owned = set["collections"]["ownedBy"]
-            except Exception as e:
-                num_owned = np.nan
-
-            # List price
-            try:
-                price = set["LEGOCom"]["US"]["retailPrice"]
-            except Exception as e:
-                price = np.nan
-
-            row = {
-                "Set_ID": set_id,
-                "Name": set_name,
-                "Year": set_year,
-                "Theme": set_theme,
-                "Theme_Group": set_theme_group,
-                "Subtheme": set_subtheme,
-                "Category": set_category,
-                "Packaging": set_packaging,
-                "Num_Instructions": set_num_instructions,
-                "Availability": set_availability,
-                "Pieces": set_pieces,
-                "Minifigures": set_minifigs,
-                "Owned": num_owned,
-                "Rating": set_rating,
-                "USD_MSRP": price,
-            }
-            rows.append(row)
-
-        df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
-
+        df = pd.concat([df, parse_sets(sets)], ignore_index=True)
     except Exception as e:
         print(f"Could not find matches for {year} -- {e}")
 
@@ -304,21 +281,33 @@ def get_data_by_year(year, df, user_hash):
     return df
 
 
-def from_scratch():
-    """Get num_owned for every set possible from Brickset API"""
+def from_scratch(checkpoint_path="custom_7_checkpoint.sqlite", max_workers=4, quota=None):
+    """Get num_owned for every set possible from Brickset API
 
-    df = pd.DataFrame(columns=["Set_ID", "Name", "Year", "Theme", "Theme_Group", "Subtheme", "Category", "Packaging",
-                               "Num_Instructions", "Availability", "Pieces", "Minifigures", "Owned", "Rating",
-                               "USD_MSRP"])
-    user_hash = get_user_hash(BS_USERNAME, BS_PASSWORD)
-    for year in range(1975, 2024):
-        df = get_data_by_year(year, df, user_hash)
-        if df is None:
-            print(f"API LIMIT REACHED: stopped at {year}")
-            break
-        else:
-            print(f"Finished {year}")
+    Years and their pages are fetched concurrently, up to max_workers requests at a time, most recent years first.
+    Calls go through quota (the shared Brickset scheduler by default), which pauses the run through the daily reset.
+    Each year's sets are checkpointed as soon as the year is complete, so an interrupted run only fetches the
+    missing years when rerun.
+    """
 
+    columns = ["Set_ID", "Name", "Year", "Theme", "Theme_Group", "Subtheme", "Category", "Packaging",
+               "Num_Instructions", "Availability", "Pieces", "Minifigures", "Owned", "Rating", "USD_MSRP"]
+    checkpoint = Checkpoint(checkpoint_path)
+    done = checkpoint.done()
+    quota = quota or brickset_quota()
+    years = quota.order([year for year in range(1975, 2024) if str(year) not in done], lambda year: -year)
+    user_hash = get_user_hash(BS_USERNAME, BS_PASSWORD)
+    try:
+        queries = [{"year": year} for year in years]
+        for index, sets in iter_query_sets(queries, BS_API_KEY, user_hash, max_workers=max_workers, quota=quota):
+            checkpoint.record(parse_sets(sets).to_dict("records"), done=[years[index]])
+            print(f"Finished {years[index]}")
+    except QuotaExhausted:
+        remaining = len(years) - len(checkpoint.done() & {str(year) for year in years})
+        print(f"API LIMIT REACHED: {remaining} years left, rerun to resume")
+
+    df = checkpoint.export(columns).sort_values("Year", kind="stable")
+    checkpoint.close()
     df.to_csv("custom_7.csv", index=False)
 
 
@@ -0,0 +1,65 @@
+# Walk-forward backtest shared by the random forest and neural network experiments
+# Each year trains a fresh model on all earlier years, scores that year's sets, builds a portfolio from the scores
+# and compares its return to the market and equal weighted indexes. Years are independent so they run in a process pool.
+
+import pandas as pd
+
+from index import get_index_returns, get_index_return
+from models import fit_model, predict_model
+from parallel import run_parallel
+
+
+def value_portfolio(test_data, predictions):
+    """Portfolio of the most undervalued sets, weighted by predicted value over list price"""
+
+    value_differential = predictions - test_data["USD_MSRP"]  # Positive means undervalued
+    portfolio = test_data[value_differential > 0].copy()
+    portfolio["Differential"] = value_differential[value_differential > 0]
+    portfolio["Weight"] = portfolio["Differential"] / portfolio["Differential"].sum()  # Weight by differential
+    # Evenly weight across top 10 biggest differntials
+    # top_10 = portfolio.sort_values(by="Differential", ascending=False).head(10)
+    # portfolio["Weight"] = 0
+    # portfolio.loc[top_10.index, "Weight"] = 1 / 10
+    return portfolio
+
+
+def gain_portfolio(test_data, predictions):
+    """Portfolio of every set, weighted by predicted gain over list price"""
+
+    portfolio = test_data.copy()
+    portfolio["Prediction"] = predictions
+    portfolio["Predicted_Gain"] = portfolio["Prediction"] / portfolio["USD_MSRP"] - 1
+    portfolio["Weight"] = portfolio["Predicted_Gain"] / portfolio["Predicted_Gain"].sum()  # Weight by gain
+    return portfolio
+
+
+def run_year(data, year, features, target, model_factory, portfolio_rule):
+    """Train on all years before year and get the return of the portfolio picked for year"""
+
+    # Train learner on all years before this one
+    training_data = data[(data["Year"] < year) & data[target].notna()]
+    model = fit_model(model_factory(), training_data[features].to_numpy(), training_data[target].to_numpy())
+
+    # Test learner on this year's sets that can be evaluated
+    test_data = data[(data["Year"] == year) & data["Current_Price"].notna()]
+    predictions = predict_model(model, test_data[features].to_numpy())
+    portfolio_return = get_index_return(portfolio_rule(test_data, predictions))
+    print(f"Finished experiment for {year}.")
+    return portfolio_return
+
+
+def run_backtest(data, features, target, model_factory, portfolio_rule, years=range(2000, 2024), n_jobs=-1):
+    """Walk-forward backtest of model_factory() and portfolio_rule(test_data, predictions), returns yearly returns"""
+
+    years = list(years)
+    tasks = [(year, features, target, model_factory, portfolio_rule) for year in years]
+    portfolio_returns = run_parallel(run_year, tasks, n_jobs, shared=data)
+
+    # Benchmarks for every year come from one pass over the data
+    index_returns = get_index_returns(years, lags=[0]).set_index("Year")
+    return pd.DataFrame({
+        "Year": years,
+        "MWI": index_returns.loc[years, "MWI"].to_numpy(),
+        "EWI": index_returns.loc[years, "EWI"].to_numpy(),
+        "Portfolio": portfolio_returns,
+    })
@@ -0,0 +1,158 @@
+# Concurrent client for the Bricklink price guide
+# One pooled requests session and one OAuth signer are shared by a bounded thread pool.
+# Requests are spaced by a rate limit and transient failures are retried with exponential backoff.
+# base_url can point at a local stand-in server for testing, and an http_cache.HTTPCache can sit in front of the session.
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CachedSession
+
+BL_API_URL = "https://api.bricklink.com/api/store/v1"
+PRICE_GUIDE_PARAMS = {
+    "guide_type": "sold",  # sold (closed) or stock (active listings)
+    "new_or_used": "N",
+    "currency_code": "USD",
+    "region": "north_america",
+}
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Spaces calls from any number of threads at least 1 / rate seconds apart"""
+
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        time.sleep(max(0, start - now))
+
+
+def make_session(pool_size=8, cache=None):
+    """Session with a keep-alive connection pool large enough for pool_size threads, read through cache if given"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session if cache is None else CachedSession(session, cache)
+
+
+def retry_after(response, default):
+    """Seconds to wait from a Retry-After header, given as seconds or an HTTP date, default when missing or unreadable"""
+
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_with_retry(session, url, params=None, auth=None, retries=3, backoff=1.0, rate_limiter=None, timeout=30):
+    """GET url and return the parsed JSON, retrying connection errors and transient statuses with backoff"""
+
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            response = session.get(url, params=params, auth=auth, timeout=timeout)
+            if response.status_code not in TRANSIENT_STATUS:
+                return response.json()
+            delay = retry_after(response, backoff * 2 ** attempt)
+            error = requests.HTTPError(f"{response.status_code} from {url}")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            delay = backoff * 2 ** attempt
+            error = e
+        if attempt < retries:
+            time.sleep(delay)
+    raise error
+
+
+def parse_orders(response):
+    """Every order in a price guide response as arrays of order dates (datetime64[ms], UTC), unit prices and quantities"""
+
+    orders = response["data"]["price_detail"]
+    # Dates look like 2023-01-02T10:00:00.000Z, dropping the Z lets numpy parse them all at once
+    dates = np.array([order["date_ordered"] for order in orders], dtype="U23").astype("datetime64[ms]")
+    prices = np.array([order["unit_price"] for order in orders], dtype=np.float64)
+    quantities = np.array([order.get("quantity", 1) for order in orders], dtype=np.int64)
+    return dates, prices, quantities
+
+
+def parse_price_guide(response):
+    """Most recent sold price and total quantity from a price guide response, NaN when missing"""
+
+    try:
+        quantity = response["data"]["total_quantity"] if "total_quantity" in response["data"] else np.nan
+    except Exception as e:
+        quantity = np.nan
+
+    try:
+        # Get most recent order for price
+        dates, prices, _ = parse_orders(response)
+        return prices[np.argmax(dates)], quantity
+    except Exception as e:
+        return np.nan, quantity
+
+
+def fetch_price_guide(set_id, session, auth, base_url=BL_API_URL, **retry_options):
+    """Price guide response for one set"""
+    url = f"{base_url}/items/SET/{set_id}/price"
+    return get_with_retry(session, url, params=dict(PRICE_GUIDE_PARAMS, no=set_id), auth=auth, **retry_options)
+
+
+def iter_current_prices(set_ids, auth, max_workers=8, rate_limit=None, retries=3, backoff=1.0, base_url=BL_API_URL,
+                        cache=None, history=None):
+    """Fetch sets concurrently, yielding (set_id, price, quantity) as each one finishes
+
+    Sets whose request keeps failing (or is not cached while offline) get None for both, sets without sales NaN.
+    Every order of each response is also added to history (a price_history.PriceHistory) if given.
+    Stopping early cancels the requests not yet started.
+    """
+
+    session = make_session(max_workers, cache)
+    rate_limiter = RateLimiter(rate_limit)
+
+    def fetch(set_id):
+        try:
+            response = fetch_price_guide(set_id, session, auth, base_url=base_url, retries=retries, backoff=backoff,
+                                         rate_limiter=rate_limiter)
+        except Exception as e:
+            print(f"Uh oh exception: {e} for {set_id}")
+            return set_id, None, None
+        if history is not None:
+            history.add(set_id, response)
+        return (set_id, *parse_price_guide(response))
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [pool.submit(fetch, set_id) for set_id in dict.fromkeys(set_ids)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        session.close()
+
@@ -0,0 +1,82 @@
+# Concurrent, paginated client for the Brickset getSets API
+# The first page of a query reports the total matches, the remaining pages are then fetched in parallel over one pooled
+# session. Several queries (e.g. years) share one bounded thread pool, so a full scrape is limited by network
+# parallelism rather than serial round trips. Requests go through the response cache like the rest of api.py, and
+# through a quota.QuotaScheduler when one is given.
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import json
+import math
+
+from bricklink import RateLimiter, get_with_retry, make_session
+from http_cache import CachedSession, default_cache
+from quota import QuotaExhausted
+
+BS_API_URL = "https://brickset.com/api/v3.asmx"
+MAX_PAGE_SIZE = 500
+
+
+class QuotaExceeded(QuotaExhausted):
+    """Brickset answered with an error message, in practice the daily API limit"""
+
+
+def get_sets_page(session, api_key, user_hash, query, page_number=1, page_size=MAX_PAGE_SIZE, base_url=BS_API_URL,
+                  **retry_options):
+    """One page of getSets, returns (matches, sets)"""
+
+    params = {
+        "apiKey": api_key,
+        "userHash": user_hash,
+        "params": json.dumps(dict(query, pageSize=page_size, pageNumber=page_number)),
+    }
+    response = get_with_retry(session, f"{base_url}/getSets", params=params, **retry_options)
+    if "message" in response:
+        raise QuotaExceeded(response["message"])
+    return response.get("matches", 0), response.get("sets", [])
+
+
+def iter_query_sets(queries, api_key, user_hash, max_workers=4, page_size=MAX_PAGE_SIZE, rate_limit=None, retries=3,
+                    backoff=1.0, base_url=BS_API_URL, cache=None, quota=None):
+    """Fetch every page of each query concurrently, yielding (query_index, sets) once all of a query's pages are in
+
+    Queries are getSets params dicts such as {"year": 2020}. Sets keep Brickset's page order within a query.
+    Calls are counted against quota (a QuotaScheduler) if given, cached pages are free.
+    Raises QuotaExhausted as soon as any page hits the API limit, pending requests are cancelled.
+    """
+
+    queries = list(queries)
+    session = make_session(max_workers)
+    if quota is not None:
+        session = quota.session(session, endpoints={"getSets"})
+    session = CachedSession(session, default_cache() if cache is None else cache)
+    retry_options = dict(retries=retries, backoff=backoff, rate_limiter=RateLimiter(rate_limit), base_url=base_url)
+
+    def fetch(index, page_number):
+        return index, page_number, get_sets_page(session, api_key, user_hash, queries[index], page_number, page_size,
+                                                 **retry_options)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = {pool.submit(fetch, index, 1) for index in range(len(queries))}
+        pages = [{} for _ in queries]
+        page_counts = [None] * len(queries)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, page_number, (matches, sets) = future.result()
+                pages[index][page_number] = sets
+                if page_number == 1:
+                    # Now the query's size is known, queue up the rest of its pages
+                    page_counts[index] = max(1, math.ceil(matches / page_size))
+                    pending |= {pool.submit(fetch, index, page) for page in range(2, page_counts[index] + 1)}
+                if len(pages[index]) == page_counts[index]:
+                    yield index, [s for page in range(1, page_counts[index] + 1) for s in pages[index].pop(page)]
+    finally:
+        pool.shutdown(cancel_futures=True)
+        session.close()
+
+
+def fetch_sets(query, api_key, user_hash, **options):
+    """Every set matching one getSets query, all pages"""
+    for _, sets in iter_query_sets([query], api_key, user_hash, **options):
+        return sets
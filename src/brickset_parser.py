@@ -0,0 +1,67 @@
+# Columnar parser for Brickset getSets responses
+# A schema maps each output column to the path of its field inside a set (e.g. collections.ownedBy) and a dtype.
+# Every column is a preallocated typed array filled from one pass over the sets, missing fields are NaN,
+# so a whole year becomes one DataFrame without building a dict per set.
+
+import numpy as np
+import pandas as pd
+
+# (column, path into the set, dtype)
+DATA_SCHEMA = [
+    ("Name", ("name",), object),
+    ("Year", ("year",), np.int64),
+    ("Theme", ("theme",), object),
+    ("Theme_Group", ("themeGroup",), object),
+    ("Subtheme", ("subtheme",), object),
+    ("Category", ("category",), object),
+    ("Packaging", ("packagingType",), object),
+    ("Num_Instructions", ("instructionsCount",), np.float64),
+    ("Availability", ("availability",), object),
+    ("Pieces", ("pieces",), np.float64),
+    ("Minifigures", ("minifigs",), np.float64),
+    ("Owned", ("collections", "ownedBy"), np.float64),
+    ("Rating", ("rating",), np.float64),
+    ("USD_MSRP", ("LEGOCom", "US", "retailPrice"), np.float64),
+]
+
+PRICE_SCHEMA = [
+    ("Item_Number", ("number",), object),
+    ("Name", ("name",), object),
+    ("Year", ("year",), np.int64),
+    ("Theme", ("theme",), object),
+    ("Subtheme", ("subtheme",), object),
+    ("Pieces", ("pieces",), np.float64),
+    ("Minifigures", ("minifigs",), np.float64),
+    ("USD_MSRP", ("LEGOCom", "US", "retailPrice"), np.float64),
+]
+
+
+def parse_column(sets, path, dtype):
+    """One field of every set as a typed array, one pass over the sets per path level"""
+
+    values = [set.get(path[0]) for set in sets]
+    for key in path[1:]:
+        values = [value.get(key) if isinstance(value, dict) else None for value in values]
+
+    column = np.empty(len(sets), dtype=dtype)
+    missing = [i for i, value in enumerate(values) if value is None]
+    if missing and np.dtype(dtype).kind == "i":  # Integer columns are required
+        raise KeyError(f"{'.'.join(path)} missing from set {sets[missing[0]].get('number')}")
+    column[:] = values  # None becomes NaN in float columns
+    if missing and column.dtype == object:
+        column[missing] = np.nan
+    return column
+
+
+def set_ids(sets):
+    """number-numberVariant id of every set"""
+    return np.array([f"{set['number']}-{set['numberVariant']}" for set in sets], dtype=object)
+
+
+def parse_sets(sets, schema=DATA_SCHEMA, with_id=True):
+    """DataFrame of a batch of sets, a column per schema entry, led by Set_ID when with_id"""
+
+    columns = {"Set_ID": set_ids(sets)} if with_id else {}
+    for name, path, dtype in schema:
+        columns[name] = parse_column(sets, path, dtype)
+    return pd.DataFrame(columns)
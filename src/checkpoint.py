@@ -0,0 +1,56 @@
+# Durable checkpoint store for long scraping runs
+# Rows are upserted into SQLite as they arrive together with the units of work (sets, years) they complete,
+# so a crash, quota hit or Ctrl-C loses nothing already fetched and a rerun resumes where it stopped.
+# Each unit keeps the time it was last done, so incremental refreshes can redo only the stale ones.
+# The final table comes from one bulk export.
+
+import json
+import sqlite3
+import time
+
+import pandas as pd
+
+
+class Checkpoint:
+    """SQLite backed store of scraped rows keyed by one column, plus the set of finished work units"""
+
+    def __init__(self, path, key="Set_ID"):
+        self.path = path
+        self.key = key
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, data TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS done (unit TEXT PRIMARY KEY, done_at REAL)")
+        if "done_at" not in {column[1] for column in self.connection.execute("PRAGMA table_info(done)")}:
+            self.connection.execute("ALTER TABLE done ADD COLUMN done_at REAL")
+        self.connection.commit()
+
+    def record(self, rows, done=(), done_at=None):
+        """Upsert rows (dicts holding the key column) and mark units done at done_at (default now), in one transaction
+
+        Rows whose data did not change are left untouched.
+        """
+        done_at = time.time() if done_at is None else done_at
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO rows VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET data = excluded.data WHERE data IS NOT excluded.data",
+                [(str(row[self.key]), json.dumps(row, default=float)) for row in rows])
+            self.connection.executemany(
+                "INSERT INTO done VALUES (?, ?) ON CONFLICT (unit) DO UPDATE SET done_at = excluded.done_at",
+                [(str(unit), done_at) for unit in done])
+
+    def done(self):
+        """Units of work already recorded, as strings"""
+        return {unit for unit, in self.connection.execute("SELECT unit FROM done")}
+
+    def done_at(self):
+        """When each recorded unit was last done, {unit: unix time}"""
+        return dict(self.connection.execute("SELECT unit, done_at FROM done"))
+
+    def export(self, columns=None):
+        """Every recorded row as a DataFrame"""
+        rows = [json.loads(data) for data, in self.connection.execute("SELECT data FROM rows ORDER BY rowid")]
+        return pd.DataFrame(rows, columns=columns)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,91 @@
+# K-fold cross validation shared by the random forest, neural network, sweep and feature importance scripts
+# Folds run in a process pool (run_folds also runs other per-fold work such as permutation importance), work with
+# both train/test and fit/predict models, and only score the training split when asked to (optionally on a row
+# sample, since in sample scoring can cost more than the fold).
+# Metrics for every fold come from one vectorized pass over the stacked fold predictions.
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+from models import fit_model, predict_model
+from parallel import run_parallel
+
+
+def fold_metrics(y, predictions, folds, num_folds):
+    """RMSE, correlation and R^2 of each fold from stacked predictions, folds gives each row's fold"""
+
+    y = np.asarray(y, dtype=np.float64)
+    predictions = np.asarray(predictions, dtype=np.float64)
+    counts = np.bincount(folds, minlength=num_folds)
+
+    # Center within each fold, then every sum is one bincount
+    y_centered = y - (np.bincount(folds, y, num_folds) / counts)[folds]
+    p_centered = predictions - (np.bincount(folds, predictions, num_folds) / counts)[folds]
+    sse = np.bincount(folds, (y - predictions) ** 2, num_folds)
+    ss_y = np.bincount(folds, y_centered ** 2, num_folds)
+    ss_p = np.bincount(folds, p_centered ** 2, num_folds)
+    ss_yp = np.bincount(folds, y_centered * p_centered, num_folds)
+
+    rmse = np.sqrt(sse / counts)
+    correlation = ss_yp / np.sqrt(ss_y * ss_p)
+    r_squared = 1 - sse / ss_y
+    return rmse, correlation, r_squared
+
+
+def kfold_splits(data, num_folds, rng):
+    """Shuffled k-fold (train_indices, test_indices) splits of data's rows, shuffled by a seed drawn from rng"""
+    kf = KFold(n_splits=num_folds, shuffle=True, random_state=rng.integers(2 ** 31))
+    return list(kf.split(data))
+
+
+def run_folds(fold_fn, data, splits, fold_args=None, n_jobs=-1):
+    """fold_fn(data, train_indices, test_indices, *fold_args[i]) for every split, in fold order"""
+    fold_args = fold_args or [()] * len(splits)
+    tasks = [(train_indices, test_indices, *args) for (train_indices, test_indices), args in zip(splits, fold_args)]
+    return run_parallel(fold_fn, tasks, n_jobs, shared=data)
+
+
+def run_fold(data, train_indices, test_indices, model_factory, in_sample_indices=None):
+    """Train a fresh model on one fold, returns test predictions and predictions for in_sample_indices if given"""
+
+    model = fit_model(model_factory(), data[train_indices, :-1], data[train_indices, -1])
+    predictions = predict_model(model, data[test_indices, :-1])
+    in_sample_predictions = None
+    if in_sample_indices is not None:
+        in_sample_predictions = predict_model(model, data[in_sample_indices, :-1])
+    return predictions, in_sample_predictions
+
+
+def cross_validate(model_factory, data, num_folds=5, in_sample=False, n_jobs=-1, seed=None):
+    """K-fold cross validation of model_factory() on data, returns out (and in) sample metrics per fold"""
+
+    # Set up cross validation
+    rng = np.random.default_rng(seed)
+    splits = kfold_splits(data, num_folds, rng)
+    # in_sample is False to skip the training split, True to score all of it, or a fraction or row count to sample
+    in_sample_rows = []
+    for train_indices, test_indices in splits:
+        in_sample_indices = None
+        if in_sample is True:
+            in_sample_indices = train_indices
+        elif in_sample:
+            size = int(in_sample * len(train_indices)) if in_sample < 1 else int(in_sample)
+            in_sample_indices = np.sort(rng.choice(train_indices, size=min(size, len(train_indices)), replace=False))
+        in_sample_rows.append(in_sample_indices)
+    results = run_folds(run_fold, data, splits, [(model_factory, rows) for rows in in_sample_rows], n_jobs)
+
+    # Stack every fold's predictions and score them all at once
+    table = pd.DataFrame({"Fold": np.arange(num_folds)})
+    y = data[:, -1]
+    folds = np.repeat(np.arange(num_folds), [len(test_indices) for _, test_indices in splits])
+    test_rows = np.concatenate([test_indices for _, test_indices in splits])
+    predictions = np.concatenate([result[0] for result in results])
+    table["RMSE_OS"], table["Correlation_OS"], table["R2_OS"] = fold_metrics(y[test_rows], predictions, folds, num_folds)
+    if in_sample:
+        folds = np.repeat(np.arange(num_folds), [len(rows) for rows in in_sample_rows])
+        in_sample_rows = np.concatenate(in_sample_rows)
+        predictions = np.concatenate([result[1] for result in results])
+        table["RMSE_IS"], table["Correlation_IS"], table["R2_IS"] = fold_metrics(y[in_sample_rows], predictions,
+                                                                                   folds, num_folds)
+    return table
@@ -0,0 +1,111 @@
+# Shared loader for the scraped sets data and the model features built from it
+# The CSV is parsed and cleaned once per process, and the cleaned frame is also cached on disk.
+# Both caches are keyed by the source file's size and modification time, so editing the CSV invalidates them.
+# With USE_STORE the CSV is read through the typed column store (store.py) instead of being parsed again.
+
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from paths import CACHE_DIR, DATA_DIR
+import store
+
+DATA_PATH = os.path.join(DATA_DIR, "custom_8.csv")
+PRICE_YEAR = 2023  # Year the current prices in DATA_PATH were scraped
+USE_STORE = True
+
+# In memory caches, keyed by source path
+_sets = {}
+_features = {}
+
+
+def _source_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def get_theme_codes(themes):
+    """Stable Theme code dictionary, themes sorted by name like pandas category codes"""
+    return {theme: code for code, theme in enumerate(sorted(pd.Series(themes).dropna().unique()))}
+
+
+def encode_themes(themes, theme_codes):
+    """Map Theme names to their codes, missing or unknown themes get -1"""
+    return pd.Series(themes).map(theme_codes).fillna(-1).astype(np.int16).to_numpy()
+
+
+def clean_sets(data, theme_codes):
+    """Shared preprocessing, fills missing counts and replaces Theme with its code"""
+
+    data = data.copy()
+    data["Minifigures"] = data["Minifigures"].fillna(0)  # Fill in missing minifigure data with 0
+    data["Pieces"] = data["Pieces"].fillna(-1)  # Fill in missing piece data with -1
+    data["Theme"] = encode_themes(data["Theme"], theme_codes)  # Categorical code approach
+    return data
+
+
+def forecast_inputs(data, year=None, price_year=PRICE_YEAR):
+    """Gap and base price (USD_MSRP) columns of the forecast model
+
+    For training (no year) Gap is the years from release to price_year and the base price is the list price.
+    Forecasting for year, Gap is the years from price_year to year and the base price is the current price.
+    """
+
+    data = data.copy()
+    if year is None:
+        data["Gap"] = price_year - data["Year"]
+    else:
+        data["Gap"] = year - price_year
+        data["USD_MSRP"] = data["Current_Price"]
+    return data
+
+
+def _load(path):
+    """Cleaned frame and theme codes for path, from memory, the disk cache, or the CSV"""
+
+    path = os.path.abspath(path)
+    key = _source_key(path)
+    if path in _sets and _sets[path]["key"] == key:
+        return _sets[path]
+
+    cache_path = os.path.join(CACHE_DIR, os.path.basename(path) + ".pkl")
+    entry = None
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            entry = pickle.load(f)
+        if entry["key"] != key or entry["path"] != path:
+            entry = None
+
+    if entry is None:
+        raw = store.read_csv(path) if USE_STORE else pd.read_csv(path, delimiter=",", quotechar='"')
+        theme_codes = get_theme_codes(raw["Theme"])
+        entry = {"path": path, "key": key, "theme_codes": theme_codes, "frame": clean_sets(raw, theme_codes)}
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            pickle.dump(entry, f)
+
+    _sets[path] = entry
+    return entry
+
+
+def load_sets(path=DATA_PATH):
+    """Gets the cleaned sets data, a fresh copy the caller is free to modify"""
+    return _load(path)["frame"].copy()
+
+
+def load_theme_codes(path=DATA_PATH):
+    """Gets the Theme code dictionary used by load_sets"""
+    return dict(_load(path)["theme_codes"])
+
+
+def get_feature_matrix(columns, dropna=("USD_MSRP", "Current_Price"), path=DATA_PATH):
+    """Gets the cleaned data as a numpy matrix of columns, dropping rows missing any of dropna"""
+
+    entry = _load(path)
+    key = (os.path.abspath(path), entry["key"], tuple(columns), tuple(dropna or ()))
+    if key not in _features:
+        data = entry["frame"].dropna(subset=list(dropna)) if dropna else entry["frame"]
+        _features[key] = data[list(columns)].to_numpy()
+    return _features[key].copy()
@@ -1,154 +1,101 @@
 # Script to explore the correlations Between features and output
 # Idea: use fraction of explained variance to see contribution of each feature using permutation
+from functools import partial
+
 import matplotlib.pyplot as plt
-from sklearn.model_selection import KFold, train_test_split
-from sklearn.metrics import r2_score
 from sklearn.neural_network import MLPRegressor
 
 import pandas as pd
 import numpy as np
 
 from BootstrapLearner import BootstrapLearner
+from cross_validation import kfold_splits, run_folds
+from dataset import get_feature_matrix
+from models import fit_model, predict_model
 from PERTLearner import PERTLearner
 
 
-def random_forest_feature_importance():
+def fold_importance(data, train_indices, test_indices, model_factory, repeats, seed):
+    """Train once on a fold and get the drop in out of sample R^2 from permuting each feature
 
-    # Set up data
-    data = pd.read_csv("../data/custom_8.csv", delimiter=",", quotechar='"')
-    data["Minifigures"] = data["Minifigures"].fillna(0)  # Fill in missing minifigure data with 0
-    data["Pieces"] = data["Pieces"].fillna(-1)  # Fill in missing piece data with 0
-    data["Theme"] = data["Theme"].astype('category').cat.codes  # Categorical code approach
-    data = data.dropna(subset=["USD_MSRP", "Current_Price"])  # Drop rows with missing data
-    features = ["Year", "Pieces", "Theme", "Minifigures", "Rating", "Owned", "USD_MSRP"]
-    clean = data[features]
-    data = clean.to_numpy()
-
-    # Rotate through features to test
-    num_features = data.shape[1] - 1
-    num_rows = data.shape[0]
-    experiment_results = pd.DataFrame(columns=["Feature", "R2_IS", "R2_OS"])
-    for i in range(num_features + 1):
-
-        # If we are testing a feature, scramble it, else test normal data
-        feature_data = data.copy()
-        if i < num_features:
-            feature_data[:, i] = feature_data[:, i][np.random.permutation(num_rows)]
-
-        # Set up learner
-        learner = BootstrapLearner(constituent=PERTLearner, kwargs={}, bags=20)
-
-        # Set up cross validation
-        kf = KFold(n_splits=5, shuffle=True)
-
-        # Train and evaluate for each fold
-        r2_is_scores = []
-        r2_os_scores = []
-        for train_indices, test_indices in kf.split(feature_data):
-            # Get split
-            x_train, y_train = feature_data[train_indices, :-1], feature_data[train_indices, -1]
-            x_test, y_test = feature_data[test_indices, :-1], feature_data[test_indices, -1]
-
-            # Train and fit
-            learner.train(x_train, y_train)
-
-            # Test in sample
-            in_sample_predictions = learner.test(x_train)
-            r_squared_in_sample = r2_score(y_train, in_sample_predictions)
-            r2_is_scores.append(r_squared_in_sample)
-
-            # Test out of sample
-            predictions = learner.test(x_test)
-            r_squared = r2_score(y_test, predictions)
-            r2_os_scores.append(r_squared)
-
-        # Compute the mean R^2 score
-        mean_r2_is = np.mean(r2_is_scores)
-        mean_r2_os = np.mean(r2_os_scores)
-        feature_results = pd.DataFrame({"Feature": features[i], "R2_IS": mean_r2_is, "R2_OS": mean_r2_os}, index=[0])
-        experiment_results = pd.concat([experiment_results, feature_results], ignore_index=True)
-        print(f"Finished testing feature: '{features[i]}'")
+    Every permuted copy of the test matrix is stacked into one batch so the model scores them in a single call,
+    returns the baseline R^2 and a (features, repeats) array of importances
+    """
 
-    # Print results
-    print(experiment_results)
-    importances = experiment_results
-    importances["In Sample"] = importances["R2_IS"][6] - importances["R2_IS"]
-    importances["Out of Sample"] = importances["R2_OS"][6] - importances["R2_OS"]
-    importances = importances[importances["Feature"] != "USD_MSRP"]
-    importances.plot.bar(x="Feature", y=["Out of Sample"], rot=0)
+    x_train, y_train = data[train_indices, :-1], data[train_indices, -1]
+    x_test, y_test = data[test_indices, :-1], data[test_indices, -1]
+    model = fit_model(model_factory(), x_train, y_train)
+    num_rows, num_features = x_test.shape
+    ss_tot = np.sum((y_test - y_test.mean()) ** 2)
+    r2_baseline = 1 - np.sum((y_test - predict_model(model, x_test)) ** 2) / ss_tot
+
+    # Copy [feature, repeat] has column feature shuffled with its own permutation
+    rng = np.random.default_rng(seed)
+    stacked = np.tile(x_test, (num_features, repeats, 1, 1))
+    for feature in range(num_features):
+        permutations = rng.permuted(np.tile(np.arange(num_rows), (repeats, 1)), axis=1)
+        stacked[feature, :, :, feature] = x_test[permutations, feature]
+
+    predictions = predict_model(model, stacked.reshape(-1, num_features)).reshape(num_features, repeats, num_rows)
+    r2_permuted = 1 - np.sum((y_test - predictions) ** 2, axis=-1) / ss_tot
+    return r2_baseline, r2_baseline - r2_permuted
+
+
+def permutation_importance(model_factory, data, features, num_folds=5, repeats=5, n_jobs=-1, seed=None):
+    """Mean and standard deviation of the drop in out of sample R^2 from permuting each feature, one model per fold"""
+
+    # Set up cross validation, each fold gets its own permutation stream
+    fold_seeds = np.random.SeedSequence(seed).spawn(num_folds)
+    splits = kfold_splits(data, num_folds, np.random.default_rng(seed))
+    fold_args = [(model_factory, repeats, fold_seed) for fold_seed in fold_seeds]
+    results = run_folds(fold_importance, data, splits, fold_args, n_jobs)
+
+    # Importances are indexed by [fold, feature, repeat]
+    importances = np.array([importance for r2_baseline, importance in results])
+    return pd.DataFrame({
+        "Feature": features,
+        "Importance": importances.mean(axis=(0, 2)),
+        "Std": importances.std(axis=(0, 2)),
+        "R2_Baseline": np.mean([r2_baseline for r2_baseline, importance in results]),
+    })
+
+
+def plot_importance(importances, title):
+    importances.plot.bar(x="Feature", y="Importance", yerr="Std", rot=0, legend=False)
     plt.ylabel("Importance")
     plt.xlabel("Feature")
-    plt.title("Feature Importance in Random Forest Model")
+    plt.title(title)
     plt.show()
 
 
+def random_forest_feature_importance():
+
+    # Set up data
+    features = ["Year", "Pieces", "Theme", "Minifigures", "Rating", "Owned"]
+    data = get_feature_matrix(features + ["USD_MSRP"])  # Drops rows missing list or current price
+
+    # Get the drop in R^2 from scrambling each feature
+    learner = partial(BootstrapLearner, constituent=PERTLearner, kwargs={}, bags=20)
+    importances = permutation_importance(learner, data, features)
+
+    # Print results
+    print(importances)
+    plot_importance(importances, "Feature Importance in Random Forest Model")
+
+
 def neural_network_feature_importance():
+
     # Set up data
-    data = pd.read_csv("../data/custom_8.csv", delimiter=",", quotechar='"')
-    data["Minifigures"] = data["Minifigures"].fillna(0)  # Fill in missing minifigure data with 0
-    data["Pieces"] = data["Pieces"].fillna(-1)  # Fill in missing piece data with 0
-    data["Theme"] = data["Theme"].astype('category').cat.codes  # Categorical code approach
-    data = data.dropna(subset=["USD_MSRP", "Current_Price"])  # Drop rows with missing data
-    features = ["Year", "Pieces", "Theme", "Minifigures", "Rating", "Owned", "USD_MSRP"]
-    clean = data[features]
-    data = clean.to_numpy()
-
-    # Rotate through features to test
-    num_features = data.shape[1] - 1
-    num_rows = data.shape[0]
-    experiment_results = pd.DataFrame(columns=["Feature", "R2_IS", "R2_OS"])
-    for i in range(num_features + 1):
-
-        # If we are testing a feature, scramble it, else test normal data
-        feature_data = data.copy()
-        if i < num_features:
-            feature_data[:, i] = feature_data[:, i][np.random.permutation(num_rows)]
-
-        # Set up learner
-        learner = MLPRegressor(hidden_layer_sizes=(35, 45, 55), activation='relu', alpha=0.0001, max_iter=4000)
-
-        # Set up cross validation
-        kf = KFold(n_splits=5, shuffle=True)
-
-        # Train and evaluate for each fold
-        r2_is_scores = []
-        r2_os_scores = []
-        for train_indices, test_indices in kf.split(feature_data):
-            # Get split
-            x_train, y_train = feature_data[train_indices, :-1], feature_data[train_indices, -1]
-            x_test, y_test = feature_data[test_indices, :-1], feature_data[test_indices, -1]
-
-            # Train and fit
-            learner.fit(x_train, y_train)
-
-            # Test in sample
-            in_sample_predictions = learner.predict(x_train)
-            r_squared_in_sample = r2_score(y_train, in_sample_predictions)
-            r2_is_scores.append(r_squared_in_sample)
-
-            # Test out of sample
-            predictions = learner.predict(x_test)
-            r_squared = r2_score(y_test, predictions)
-            r2_os_scores.append(r_squared)
-
-        # Compute the mean R^2 score
-        mean_r2_is = np.mean(r2_is_scores)
-        mean_r2_os = np.mean(r2_os_scores)
-        feature_results = pd.DataFrame({"Feature": features[i], "R2_IS": mean_r2_is, "R2_OS": mean_r2_os}, index=[0])
-        experiment_results = pd.concat([experiment_results, feature_results], ignore_index=True)
-        print(f"Finished testing feature: '{features[i]}'")
+    features = ["Year", "Pieces", "Theme", "Minifigures", "Rating", "Owned"]
+    data = get_feature_matrix(features + ["USD_MSRP"])  # Drops rows missing list or current price
+
+    # Get the drop in R^2 from scrambling each feature
+    learner = partial(MLPRegressor, hidden_layer_sizes=(35, 45, 55), activation='relu', alpha=0.0001, max_iter=4000)
+    importances = permutation_importance(learner, data, features)
 
     # Print results
-    print(experiment_results)
-    importances = experiment_results
-    importances["In Sample"] = importances["R2_IS"][6] - importances["R2_IS"]
-    importances["Out of Sample"] = importances["R2_OS"][6] - importances["R2_OS"]
-    importances = importances[importances["Feature"] != "USD_MSRP"]
-    importances.plot.bar(x="Feature", y=["Out of Sample"], rot=0)
-    plt.ylabel("Importance")
-    plt.xlabel("Feature")
-    plt.title("Feature Importance in Neural Network")
-    plt.show()
+    print(importances)
+    plot_importance(importances, "Feature Importance in Neural Network")
 
 
 def main():
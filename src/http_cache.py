@@ -0,0 +1,200 @@
+# On-disk cache of JSON API responses shared by the Brickset and Bricklink clients
+# Responses are keyed by endpoint and normalized params with the credentials left out, expire after a per-endpoint
+# TTL and the least recently used ones are evicted once the cache outgrows its size limit.
+# In offline mode every request is replayed from the cache (stale or not) and a miss raises instead of going out,
+# set LEGO_OFFLINE=1 to run the scraping pipelines without network.
+# Quota and other error responses are never stored, and neither are responses that are credentials (login).
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+from paths import CACHE_DIR
+
+HTTP_CACHE_PATH = os.path.join(CACHE_DIR, "http.sqlite")
+CREDENTIAL_PARAMS = {"apiKey", "userHash", "password"}
+DAY = 24 * 60 * 60
+UNCACHED_ENDPOINTS = {"login"}  # The Brickset login response is the user hash
+TTLS = {
+    "getSets": 7 * DAY,  # Brickset set data, ownedBy counts drift slowly
+    "price": DAY,  # Bricklink price guide
+}
+DEFAULT_TTL = DAY
+
+
+class CacheMiss(LookupError):
+    """Request not in the cache while offline"""
+
+
+def endpoint_name(url):
+    """Last path component of an API url, e.g. getSets or price"""
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def normalize_params(params):
+    """Params without credentials in a canonical order, JSON encoded values are re-encoded with sorted keys"""
+
+    normalized = {}
+    for name, value in (params or {}).items():
+        if name in CREDENTIAL_PARAMS:
+            continue
+        if isinstance(value, str) and value[:1] in "{[":
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        normalized[name] = value
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def is_cacheable(body):
+    """False for Brickset errors (quota exceeded has a top level message) and Bricklink responses that are not OK"""
+    if not isinstance(body, dict):
+        return False
+    if body.get("status") == "error" or "message" in body:
+        return False
+    return body.get("meta", {}).get("code", 200) == 200
+
+
+class HTTPCache:
+    """SQLite backed store of compressed JSON responses, safe to share between threads"""
+
+    def __init__(self, path=HTTP_CACHE_PATH, max_bytes=256 * 2 ** 20, ttls=None, offline=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.offline = os.environ.get("LEGO_OFFLINE", "") not in ("", "0") if offline is None else offline
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, endpoint TEXT, body BLOB, size INTEGER, stored_at REAL, used_at REAL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+
+        # Drop credentials stored by older versions
+        self.connection.executemany("DELETE FROM responses WHERE endpoint = ?",
+                                    [(endpoint,) for endpoint in UNCACHED_ENDPOINTS])
+        self.connection.commit()
+
+    def key(self, url, params=None):
+        return hashlib.sha1(f"{url}?{normalize_params(params)}".encode()).hexdigest()
+
+    def lookup(self, url, params=None):
+        """Cached content for a request, None when missing or expired (expired entries are still used offline)"""
+
+        key = self.key(url, params)
+        with self.lock:
+            row = self.connection.execute("SELECT body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            body, stored_at = row
+            now = time.time()
+            if not self.offline and now - stored_at > self.ttls.get(endpoint_name(url), DEFAULT_TTL):
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+        return zlib.decompress(body)
+
+    def store(self, url, params, content):
+        """Store the raw content of a successful response, then evict down to max_bytes"""
+
+        if endpoint_name(url) in UNCACHED_ENDPOINTS:
+            return
+        body = zlib.compress(content)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                                    (self.key(url, params), endpoint_name(url), body, len(body), now, now))
+            total, = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if total > self.max_bytes:
+                evict = []
+                for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY used_at"):
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((key,))
+                    total -= size
+                self.connection.executemany("DELETE FROM responses WHERE key = ?", evict)
+
+    def clear(self, endpoint=None):
+        """Drop every response, or only one endpoint's"""
+        with self.lock, self.connection:
+            if endpoint is None:
+                self.connection.execute("DELETE FROM responses")
+            else:
+                self.connection.execute("DELETE FROM responses WHERE endpoint = ?", (endpoint,))
+
+    def close(self):
+        self.connection.close()
+
+
+@functools.lru_cache(maxsize=None)
+def default_cache():
+    """Process wide cache at HTTP_CACHE_PATH, opened on first use"""
+    return HTTPCache()
+
+
+class CachedResponse:
+    """Stands in for a requests.Response replayed from the cache"""
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, content):
+        self.content = content
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class CachedSession:
+    """Read through cache in front of a requests session (or the requests module itself)
+
+    get() takes the same arguments as requests.get and returns a CachedResponse on a hit.
+    Credential endpoints always go to the network, offline they raise CacheMiss.
+    """
+
+    def __init__(self, session=requests, cache=None):
+        self.session = session
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache if self._cache is not None else default_cache()
+
+    def get(self, url, params=None, **kwargs):
+        cache = self.cache
+        if endpoint_name(url) in UNCACHED_ENDPOINTS:
+            if cache.offline:
+                raise CacheMiss(f"{url} is never cached")
+            return self.session.get(url, params=params, **kwargs)
+        content = cache.lookup(url, params)
+        if content is not None:
+            return CachedResponse(content)
+        if cache.offline:
+            raise CacheMiss(f"{url} {normalize_params(params)} is not cached")
+
+        response = self.session.get(url, params=params, **kwargs)
+        if response.status_code == 200:
+            try:
+                cacheable = is_cacheable(response.json())
+            except ValueError:
+                cacheable = False
+            if cacheable:
+                cache.store(url, params, response.content)
+        return response
+
+    def close(self):
+        if hasattr(self.session, "close"):
+            self.session.close()
@@ -3,12 +3,14 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from dataset import load_sets
+
 
 def get_market_weight_index(year, lag=2):
     """Gets a market weighted index of Lego sets for a given year"""
 
     # Read in data
-    data = pd.read_csv("../data/custom_8.csv")
+    data = load_sets()
     data = data.dropna(subset=["USD_MSRP", "Current_Price"])  # Drop missing prices so can be evaluated
     data = data[data["Year"].between(year-lag, year)]  # Filter by year, do we want to include some previous years where prices are likely the same?
 
@@ -23,7 +25,7 @@ def get_equal_weighted_index(year, lag=2):
     """Gets an equal weighted index of Lego sets for a given year"""
 
     # Read in data
-    data = pd.read_csv("../data/custom_8.csv")
+    data = load_sets()
     data = data.dropna(subset=["USD_MSRP", "Current_Price"])  # Drop missing prices so can be evaluated
     data = data[data["Year"].between(year-lag, year)]  # Filter by year, do we want to include some previous years where prices are likely the same?
 
@@ -41,15 +43,50 @@ def get_index_return(index):
     return index["Return_Weighted"].sum()
 
 
+def get_index_returns(years=range(1975, 2024), lags=range(0, 6)):
+    """Gets market and equal weighted index returns for every year and lag in one pass
+
+    Returns a tidy table with a row per (Year, Lag) and columns MWI and EWI, the same values as
+    get_index_return on get_market_weight_index(year, lag) and get_equal_weighted_index(year, lag).
+    Windows without any priced sets are NaN.
+    """
+
+    # Read in data
+    data = load_sets()
+    data = data.dropna(subset=["USD_MSRP", "Current_Price"])  # Drop missing prices so can be evaluated
+
+    # Per year sums, NaN market caps drop out of the market weighted sums like they do in the single year index
+    set_return = data["Current_Price"] / data["USD_MSRP"] - 1
+    market_cap = data["Current_Price"] * data["Owned"]
+    sums = pd.DataFrame({
+        "Year": data["Year"],
+        "Market_Cap": market_cap,
+        "Cap_Return": set_return * market_cap,
+        "Return": set_return,
+        "Count": 1,
+    }).groupby("Year").sum()
+
+    # Each window [year - lag, year] is a rolling sum over consecutive years
+    years = list(years)
+    all_years = range(min(years) - max(lags), max(years) + 1)
+    sums = sums.reindex(all_years, fill_value=0)
+    tables = []
+    for lag in lags:
+        window = sums.rolling(lag + 1, min_periods=1).sum().loc[years]
+        has_sets = window["Count"] > 0
+        tables.append(pd.DataFrame({
+            "Year": years,
+            "Lag": lag,
+            "MWI": (window["Cap_Return"] / window["Market_Cap"]).where(has_sets).to_numpy(),
+            "EWI": (window["Return"] / window["Count"]).where(has_sets).to_numpy(),
+        }))
+    return pd.concat(tables, ignore_index=True)
+
+
 def main():
 
-    df = pd.DataFrame(columns=["Year", "Market_Weighted_Return", "Equal_Weighted_Return"])
-    for year in range(2000, 2023):
-        mw_index = get_market_weight_index(year)
-        ew_index = get_equal_weighted_index(year)
-        mw_return = get_index_return(mw_index)
-        ew_return = get_index_return(ew_index)
-        df = pd.concat([df, pd.DataFrame([[year, mw_return, ew_return]], columns=["Year", "Market_Weighted_Return", "Equal_Weighted_Return"])])
+    returns = get_index_returns(range(2000, 2023), lags=[2])
+    df = returns.rename(columns={"MWI": "Market_Weighted_Return", "EWI": "Equal_Weighted_Return"})
 
     df["Market_Weighted_Return"] = df["Market_Weighted_Return"] * 100
     df["Equal_Weighted_Return"] = df["Equal_Weighted_Return"] * 100
@@ -0,0 +1,161 @@
+# Merges every data source into one master table of sets
+# Set ids come as Rebrickable set_num ("0011-2"), Brickset number-numberVariant ("75159-1") or bare item numbers
+# ("10246"). All of them are normalized to an integer key plus a variant: plain numbers keep their value, anything else
+# (letters, leading zeros) gets a deterministic negative hash of its text so the two can never collide.
+# Each source is read once and indexed by (key, variant), the master table is the sorted union of the keys and every
+# column is filled from its sources in precedence order by vectorized index lookups, so the merge is one pass over
+# the data and the same inputs always give the same table. Coverage statistics record where each value came from.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_DIR
+from store import DatasetStore
+
+# Source name -> file, id column, {source column: master column} and source values that mean missing
+SOURCES = {
+    "brickset": {
+        "path": "custom_8.csv",
+        "id": "Set_ID",
+        "columns": {column: column for column in [
+            "Name", "Year", "Theme", "Theme_Group", "Subtheme", "Category", "Packaging", "Num_Instructions",
+            "Availability", "Pieces", "Minifigures", "Owned", "Rating", "USD_MSRP"]},
+    },
+    "bricklink": {
+        "path": "custom_8.csv",
+        "id": "Set_ID",
+        "columns": {"Total_Quantity": "Total_Quantity", "Current_Price": "Current_Price"},
+    },
+    "lego_sets": {
+        "path": "lego_sets.csv",
+        "id": "Item_Number",
+        "columns": {column: column for column in [
+            "Name", "Year", "Theme", "Subtheme", "Pieces", "Minifigures", "USD_MSRP", "Packaging", "Availability"]},
+    },
+    "bricklink_2018": {
+        "path": "custom_6.csv",
+        "id": "Item_Number",
+        "columns": {"Current_Price": "Current_Price"},
+        "missing": {"Current_Price": [0]},
+    },
+    "catalog": {
+        "path": "catalog.csv",
+        "id": "set_num",
+        "columns": {"name": "Name", "year": "Year", "num_parts": "Pieces"},
+    },
+}
+
+# Master column -> sources in precedence order, other columns take the sources in SOURCES order
+PRECEDENCE = {
+    "USD_MSRP": ["brickset", "lego_sets"],
+    "Current_Price": ["bricklink", "bricklink_2018"],
+    "Pieces": ["brickset", "lego_sets", "catalog"],
+}
+
+
+def normalize_set_ids(ids, default_variant=1):
+    """Integer key, variant and number text of each set id, ids without a -variant suffix get default_variant"""
+
+    ids = pd.Series(ids, dtype=object).astype(str).str.strip()
+    parts = ids.str.extract(r"^(.*?)(?:-(\d+))?$")
+    number = parts[0]
+    variant = parts[1].fillna(default_variant).astype(np.int64).to_numpy()
+
+    # Plain numbers are their own key, anything else hashes to a negative key
+    numeric = number.str.fullmatch(r"0|[1-9]\d{0,17}").to_numpy()
+    key = np.empty(len(ids), dtype=np.int64)
+    key[numeric] = number[numeric].astype(np.int64).to_numpy()
+    hashed = pd.util.hash_pandas_object(number[~numeric], index=False).to_numpy()
+    key[~numeric] = -(hashed >> np.uint64(1)).astype(np.int64) - 1
+    return key, variant, number.to_numpy()
+
+
+def read_source(source, data_dir=DATA_DIR):
+    """One source's frame indexed by (Set_Key, Variant), first row kept for repeated ids, and its repeat count"""
+
+    frame = pd.read_csv(os.path.join(data_dir, source["path"]), dtype={source["id"]: str},
+                        usecols=[source["id"], *source["columns"]], low_memory=False)
+    key, variant, number = normalize_set_ids(frame[source["id"]], source.get("default_variant", 1))
+    for column, values in source.get("missing", {}).items():
+        frame[column] = frame[column].replace(values, np.nan)
+    frame = frame[list(source["columns"])].rename(columns=source["columns"])
+    frame["Number"] = number
+    frame.index = pd.MultiIndex.from_arrays([key, variant], names=["Set_Key", "Variant"])
+    repeated = frame.index.duplicated()
+    return frame[~repeated], int(repeated.sum())
+
+
+def merge_sources(sources=SOURCES, precedence=PRECEDENCE, data_dir=DATA_DIR):
+    """Master table of every set in any source, returns (table, coverage, source_stats)
+
+    coverage has a row per master column with how many values each source supplied and the fraction of sets with a
+    value. source_stats has each source's distinct sets, repeated ids (only the first row is used) and unique sets.
+    """
+
+    frames, repeats = {}, {}
+    for name, source in sources.items():
+        frames[name], repeats[name] = read_source(source, data_dir)
+
+    # Sorted union of every source's keys
+    keys = pd.MultiIndex.from_arrays([
+        np.concatenate([frame.index.get_level_values(0) for frame in frames.values()]),
+        np.concatenate([frame.index.get_level_values(1) for frame in frames.values()]),
+    ], names=["Set_Key", "Variant"]).unique().sort_values()
+    lookups = {name: frame.index.get_indexer(keys) for name, frame in frames.items()}
+
+    # Every master column with its sources in precedence order, the set number text comes from any source
+    order = {"Number": list(sources)}
+    for source in sources.values():
+        for column in source["columns"].values():
+            order[column] = precedence.get(column, [name for name, source in sources.items()
+                                                    if column in source["columns"].values()])
+
+    # Fill each column from its sources, a lower precedence source only fills what is still missing
+    table = {}
+    coverage = []
+    for column, names in order.items():
+        values = pd.Series(np.nan, index=range(len(keys)), dtype=object)
+        supplied = {}
+        for name in names:
+            source_values = frames[name][column].to_numpy()
+            found = lookups[name] >= 0
+            fill = found & values.isna().to_numpy()
+            fill[found] &= pd.notna(source_values[lookups[name][found]])
+            values[fill] = source_values[lookups[name][fill]]
+            supplied[name] = int(fill.sum())
+        table[column] = values.infer_objects()
+        coverage.append({"Column": column, **supplied, "Coverage": values.notna().mean()})
+
+    table = pd.DataFrame(table)
+    table.insert(0, "Set_ID", table.pop("Number") + "-" + keys.get_level_values(1).astype(str))
+    table.insert(1, "Set_Key", keys.get_level_values(0))
+    table.insert(2, "Variant", keys.get_level_values(1))
+    coverage = pd.DataFrame(coverage).set_index("Column")
+    coverage[list(sources)] = coverage[list(sources)].fillna(0).astype(int)
+
+    # Sets only one source knows about
+    found = np.array([lookups[name] >= 0 for name in sources])
+    source_stats = pd.DataFrame({
+        "Sets": [len(frames[name]) for name in sources],
+        "Repeated_IDs": [repeats[name] for name in sources],
+        "Only_Source": (found & (found.sum(axis=0) == 1)).sum(axis=1),
+    }, index=list(sources))
+    return table, coverage, source_stats
+
+
+def main():
+
+    # Rebuild the master table from every source and snapshot it in the column store
+    table, coverage, source_stats = merge_sources()
+    pd.set_option("display.width", 200)
+    print(source_stats)
+    print(coverage)
+    sources = {name: source["path"] for name, source in SOURCES.items()}
+    version = DatasetStore().commit("master", table, {"sources": sources})
+    print(f"{len(table)} sets, stored as master version {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Versioned binary format for trained models
+# Layout: 8 byte magic, 4 byte little endian header length, JSON header, then the raw arrays.
+# Each array starts on a 64 byte boundary so loading can memory-map it in place,
+# and processes that map the same file share its pages read-only.
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b"LEGOMDL\0"
+VERSION = 1
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_arrays(path, arrays, meta):
+    """Write a dict of numpy arrays plus JSON serializable metadata to a single model file"""
+
+    # Array offsets are relative to the start of the data section, which follows the header
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"version": VERSION, "meta": meta, "arrays": layout}).encode()
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+
+def load_arrays(path, mmap=True):
+    """Read a model file, returns its arrays and metadata
+
+    With mmap the arrays are read-only np.memmap views of the file, otherwise they are loaded into memory
+    """
+
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model file")
+        header_length, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_length))
+        if header["version"] > VERSION:
+            raise ValueError(f"{path} has format version {header['version']}, newest supported is {VERSION}")
+        data_start = _align(len(MAGIC) + 4 + header_length)
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            shape = tuple(spec["shape"])
+            count = int(np.prod(shape))
+            if mmap and count > 0:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + spec["offset"], shape=shape)
+            else:
+                f.seek(data_start + spec["offset"])
+                arrays[name] = np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype).reshape(shape)
+    return arrays, header["meta"]
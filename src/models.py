@@ -0,0 +1,18 @@
+# Adapters between the two model interfaces used across the experiments
+# The forest and tree learners use train/test, sklearn models such as MLPRegressor use fit/predict.
+
+
+def fit_model(model, x, y):
+    """Train a model with either the train/test or the sklearn fit/predict interface"""
+    if hasattr(model, "fit"):
+        model.fit(x, y)
+    else:
+        model.train(x, y)
+    return model
+
+
+def predict_model(model, x):
+    """Score a model with either the train/test or the sklearn fit/predict interface"""
+    if hasattr(model, "predict"):
+        return model.predict(x)
+    return model.test(x)
@@ -1,73 +1,49 @@
-
-from sklearn.model_selection import KFold
-from sklearn.metrics import mean_squared_error
 from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import StandardScaler
 
 import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
 
+from cross_validation import cross_validate
+from dataset import load_sets
 
-def main():
 
-    data = pd.read_csv("./data/custom_8.csv", delimiter=",", quotechar='"')
-    data["Minifigures"] = data["Minifigures"].fillna(0)  # Fill in missing minifigure data with 0
-    data["Pieces"] = data["Pieces"].fillna(-1)  # Fill in missing piece data with -1, is this appropriate? need to test
-    data["Theme"] = data["Theme"].astype('category').cat.codes  # Categorical code approach
+def get_data():
+    """List price from the sets features, the features followed by the target column"""
+
+    data = load_sets()
     # counts = data["Theme"].value_counts().to_dict()  # Frequency encoding approach, some themes have same count tho
     # data["Theme"] = data["Theme"].map(counts)
     data = data.dropna()  # Drop rows with missing data - 1939 remaining...
     clean = data[["Year", "Pieces", "Minifigures", "Theme", "USD_MSRP"]]
-    data = clean.to_numpy()
-    num_features = 5
+    return clean.to_numpy()
 
 
-    # Normalize the input data
-    scaler = StandardScaler()
-    data[:, :-1] = scaler.fit_transform(data[:, :-1])
+def mlp_pipeline(hidden_layer_sizes=(35, 45, 55), max_iter=4000, random_state=None):
+    """Untrained network, inputs are standardized on each fold's training data"""
+    return make_pipeline(StandardScaler(),
+                         MLPRegressor(hidden_layer_sizes=hidden_layer_sizes, activation='relu', alpha=0.0001,
+                                      max_iter=max_iter, random_state=random_state))
 
 
-    # Set up the network
-    mlp = MLPRegressor(hidden_layer_sizes=(35, 45, 55), activation='relu', alpha=0.0001, max_iter=4000)
+def main():
 
-    # Set up cross validation
-    num_folds = 10
-    kf = KFold(n_splits=num_folds, shuffle=True)
+    data = get_data()
+    num_features = 5
+
+    # Set up the network
+    mlp = mlp_pipeline
 
     # Train and evaluate for each fold
-    rmse_scores = []
-    correlation_scores = []
-    rmse_in_sample_scores = []
-    correlation_in_sample_scores = []
-    for train_indices, test_indices in kf.split(data):
-
-        # Get split
-        x_train, y_train = data[train_indices, :-1], data[train_indices, -1]
-        x_test, y_test = data[test_indices, :-1], data[test_indices, -1]
-
-        # Train and fit
-        mlp.fit(x_train, y_train)
-
-        # Test in sample
-        in_sample_predictions = mlp.predict(x_train)
-        rmse_in_sample = mean_squared_error(y_train, in_sample_predictions, squared=False)
-        correlation_in_sample = np.corrcoef(y_train.astype(np.float64), in_sample_predictions)[0, 1]
-        rmse_in_sample_scores.append(rmse_in_sample)
-        correlation_in_sample_scores.append(correlation_in_sample)
-
-        # Test out of sample
-        predictions = mlp.predict(x_test)
-        rmse = mean_squared_error(y_test, predictions, squared=False)
-        correlation = np.corrcoef(y_test.astype(np.float64), predictions)[0, 1]
-        rmse_scores.append(rmse)
-        correlation_scores.append(correlation)
+    num_folds = 10
+    scores = cross_validate(mlp, data, num_folds=num_folds, in_sample=True)
+    rmse_scores = scores["RMSE_OS"].tolist()
 
     # Compute the mean score over all folds
-    mean_rmse_os = np.mean(rmse_scores)
-    mean_correlation_os = np.mean(correlation_scores)
-    mean_rmse_is = np.mean(rmse_in_sample_scores)
-    mean_correlation_is = np.mean(correlation_in_sample_scores)
+    mean_rmse_os = scores["RMSE_OS"].mean()
+    mean_correlation_os = scores["Correlation_OS"].mean()
+    mean_rmse_is = scores["RMSE_IS"].mean()
+    mean_correlation_is = scores["Correlation_IS"].mean()
 
     # Print Results
     # print(f"Mean Squared Error (in sample): {mean_rmse_is}\n\t{rmse_in_sample_scores}")
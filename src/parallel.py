@@ -0,0 +1,71 @@
+# Process pool helper shared by the backtest, cross validation, sweep, importance, scoring and forest training code
+# A large read-only input (a data set, a model) is handed to each worker once through the pool initializer instead
+# of being pickled with every task. Tasks are submitted lazily within a bounded window, so a long stream of tasks
+# never piles up in memory, and results come back in task order or as soon as they finish.
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import os
+
+
+def resolve_jobs(n_jobs, num_tasks=None):
+    """Number of worker processes for n_jobs (-1 uses all cores), never more than num_tasks"""
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    n_jobs = max(1, n_jobs or 1)
+    return n_jobs if num_tasks is None else max(1, min(n_jobs, num_tasks))
+
+
+# Shared input of this pool worker, set once by the initializer
+_worker_shared = {}
+
+
+def _set_worker_shared(shared, load):
+    _worker_shared["shared"] = shared if load is None else load(shared)
+
+
+def _call_shared(fn, task):
+    return fn(_worker_shared["shared"], *task)
+
+
+def _collect(pending, ordered):
+    """Wait for the oldest pending future (or any when not ordered) and yield (index, result) of those done"""
+    if ordered:
+        done = [next(iter(pending))]
+    else:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        yield pending.pop(future), future.result()
+
+
+def iter_parallel(fn, tasks, n_jobs=-1, shared=None, load=None, ordered=True, max_pending=None):
+    """Yield (index, fn(shared, *task)) for every task as run_parallel does, in task order or as they finish
+
+    At most max_pending tasks (two per worker by default) are in flight, so tasks may be a lazy iterator.
+    """
+
+    n_jobs = resolve_jobs(n_jobs, len(tasks) if hasattr(tasks, "__len__") else None)
+    if n_jobs == 1:
+        shared = shared if load is None else load(shared)
+        for index, task in enumerate(tasks):
+            yield index, fn(shared, *task)
+        return
+
+    max_pending = max_pending or 2 * n_jobs
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_set_worker_shared, initargs=(shared, load)) as pool:
+        pending = {}  # Future -> task index, in submission order
+        for index, task in enumerate(tasks):
+            pending[pool.submit(_call_shared, fn, task)] = index
+            while len(pending) >= max_pending:
+                yield from _collect(pending, ordered)
+        while pending:
+            yield from _collect(pending, ordered)
+
+
+def run_parallel(fn, tasks, n_jobs=-1, shared=None, load=None):
+    """List of fn(shared, *task) for every task in task order
+
+    n_jobs is the number of worker processes, -1 uses all cores and 1 runs the tasks in this process. Each worker
+    receives shared once, or load(shared) when load is given (e.g. a model loaded from its path). With several jobs
+    fn, shared and load must be picklable: module level functions or functools.partial of them.
+    Every function in this repo taking n_jobs passes it through here.
+    """
+    return [result for _, result in iter_parallel(fn, tasks, n_jobs, shared, load)]
@@ -0,0 +1,7 @@
+# Data and cache locations shared by the scraping clients and the dataset loader
+# Kept free of imports so low-level modules can use them without pulling in pandas or the loaders.
+
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data")
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
@@ -0,0 +1,148 @@
+# Time series store of every Bricklink sold order, not just the most recent one
+# Orders (set, date, unit price, quantity) are kept as columnar .npz partitions, one per order year, each sorted by
+# set and date. A query only opens the years its date range covers and finds a set's orders by binary search,
+# so questions like "median sold price of 75159-1 in 2021Q3" never scan the whole history.
+# Fetched responses are buffered by add() and merged into their partitions (dropping repeated orders) by flush().
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bricklink import parse_orders
+from paths import DATA_DIR
+
+HISTORY_DIR = os.path.join(DATA_DIR, "price_history")
+COLUMNS = ["Set_ID", "Date", "Unit_Price", "Quantity"]
+
+
+def _year(dates):
+    return dates.astype("datetime64[Y]").astype(int) + 1970
+
+
+def _empty():
+    return {
+        "Set_ID": np.array([], dtype="U1"),
+        "Date": np.array([], dtype="datetime64[ms]"),
+        "Unit_Price": np.array([], dtype=np.float64),
+        "Quantity": np.array([], dtype=np.int64),
+    }
+
+
+def _concat(parts):
+    return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+
+def _take(columns, index):
+    return {column: columns[column][index] for column in COLUMNS}
+
+
+class PriceHistory:
+    """Sold orders of every set, partitioned by order year under path"""
+
+    def __init__(self, path=HISTORY_DIR):
+        self.path = path
+        self.pending = []
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _partition_path(self, year):
+        return os.path.join(self.path, f"{year}.npz")
+
+    def years(self):
+        """Order years with a partition on disk"""
+        return sorted(int(name[:-4]) for name in os.listdir(self.path) if name.endswith(".npz"))
+
+    def load_partition(self, year):
+        if not os.path.exists(self._partition_path(year)):
+            return _empty()
+        with np.load(self._partition_path(year)) as partition:
+            columns = {column: partition[column] for column in COLUMNS}
+        columns["Date"] = columns["Date"].astype("datetime64[ms]")
+        return columns
+
+    def add(self, set_id, response):
+        """Buffer every order of one price guide response, safe to call from fetcher threads"""
+        try:
+            dates, prices, quantities = parse_orders(response)
+        except (KeyError, TypeError, ValueError):
+            return 0
+        orders = {"Set_ID": np.full(len(dates), set_id), "Date": dates, "Unit_Price": prices, "Quantity": quantities}
+        with self.lock:
+            self.pending.append(orders)
+        return len(dates)
+
+    def flush(self):
+        """Merge the buffered orders into their year partitions, returns how many new orders were stored"""
+
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return 0
+        new = _concat(pending)
+        order_years = _year(new["Date"])
+        added = 0
+        for year in np.unique(order_years):
+            existing = self.load_partition(year)
+            merged = _concat([existing, _take(new, order_years == year)])
+
+            # Sort by set then date and drop orders already stored
+            order = np.lexsort((merged["Quantity"], merged["Unit_Price"], merged["Date"], merged["Set_ID"]))
+            merged = _take(merged, order)
+            repeated = np.ones(len(order), dtype=bool)
+            for column in COLUMNS:
+                repeated[1:] &= merged[column][1:] == merged[column][:-1]
+            repeated[0] = False
+            merged = _take(merged, ~repeated)
+            added += len(merged["Date"]) - len(existing["Date"])
+
+            partition = dict(merged, Date=merged["Date"].astype(np.int64))
+            temporary = self._partition_path(year) + ".tmp.npz"
+            np.savez(temporary, **partition)
+            os.replace(temporary, self._partition_path(year))
+        return added
+
+    def orders(self, set_id=None, start=None, end=None):
+        """Orders of one set (or every set) dated in [start, end), as a DataFrame"""
+
+        start = None if start is None else np.datetime64(pd.Timestamp(start), "ms")
+        end = None if end is None else np.datetime64(pd.Timestamp(end), "ms")
+        years = [year for year in self.years()
+                 if (start is None or year >= _year(start)) and (end is None or year <= _year(end - 1))]
+        parts = []
+        for year in years:
+            columns = self.load_partition(year)
+            if set_id is not None:
+                lo = np.searchsorted(columns["Set_ID"], set_id, side="left")
+                hi = np.searchsorted(columns["Set_ID"], set_id, side="right")
+                columns = _take(columns, slice(lo, hi))
+            keep = np.ones(len(columns["Date"]), dtype=bool)
+            if start is not None:
+                keep &= columns["Date"] >= start
+            if end is not None:
+                keep &= columns["Date"] < end
+            parts.append(_take(columns, keep))
+        return pd.DataFrame(_concat(parts) if parts else _empty())
+
+    def median_price(self, set_id, start=None, end=None):
+        """Median sold unit price of a set over [start, end), NaN without orders"""
+        prices = self.orders(set_id, start, end)["Unit_Price"]
+        return prices.median() if len(prices) else np.nan
+
+    def quarter_median(self, set_id, quarter):
+        """Median sold unit price of a set in a quarter such as 2021Q3"""
+        period = pd.Period(quarter, freq="Q")
+        return self.median_price(set_id, period.start_time, (period + 1).start_time)
+
+    def quarterly(self, set_id=None, start=None, end=None):
+        """Median unit price, order count and quantity sold per set per quarter"""
+
+        orders = self.orders(set_id, start, end)
+        orders["Quarter"] = orders["Date"].dt.to_period("Q")
+        table = orders.groupby(["Set_ID", "Quarter"]).agg(
+            Median_Price=("Unit_Price", "median"),
+            Orders=("Unit_Price", "size"),
+            Quantity=("Quantity", "sum"),
+        )
+        return table.reset_index()
@@ -0,0 +1,174 @@
+# Quota aware scheduling of API calls
+# Calls are counted per key per quota day in a local SQLite ledger, so the budget survives restarts and is shared
+# by every script using the same key. A token bucket spaces calls within the day. When the day's budget is spent
+# (or the API says so first) callers sleep until the next reset and carry on, so multi-day backfills run unattended.
+# Pending work is ordered by priority before it is handed out.
+
+from datetime import datetime, timedelta, timezone
+import os
+import sqlite3
+import threading
+import time
+
+from http_cache import endpoint_name
+from paths import CACHE_DIR
+
+QUOTA_PATH = os.path.join(CACHE_DIR, "quota.sqlite")
+
+
+class QuotaExhausted(Exception):
+    """The day's calls are used up and the scheduler was told not to wait for the reset"""
+
+
+class TokenBucket:
+    """Allows bursts of up to burst calls, refilled at rate calls per second, shared between threads"""
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        time.sleep(delay)
+
+
+class QuotaLedger:
+    """Persistent count of calls made per key per quota day"""
+
+    def __init__(self, path=QUOTA_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS calls (key TEXT, day TEXT, count INTEGER, PRIMARY KEY (key, day))")
+        self.connection.commit()
+
+    def used(self, key, day):
+        row = self.connection.execute("SELECT count FROM calls WHERE key = ? AND day = ?", (key, day)).fetchone()
+        return row[0] if row else 0
+
+    def add(self, key, day, calls=1):
+        with self.connection:
+            self.connection.execute("INSERT INTO calls VALUES (?, ?, ?) "
+                                    "ON CONFLICT (key, day) DO UPDATE SET count = count + excluded.count",
+                                    (key, day, calls))
+
+    def set(self, key, day, calls):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO calls VALUES (?, ?, ?)", (key, day, calls))
+
+    def close(self):
+        self.connection.close()
+
+
+class QuotaScheduler:
+    """Hands out calls against a daily limit for one API key
+
+    key names the budget in the ledger, daily_limit is the calls allowed per day (None for no limit) and the day
+    starts at reset_hour UTC. rate and burst shape the token bucket. With wait=False acquire raises QuotaExhausted
+    instead of sleeping until the reset.
+    """
+
+    def __init__(self, key, daily_limit=None, rate=None, burst=1, reset_hour=0, wait=True, path=QUOTA_PATH):
+        self.key = key
+        self.daily_limit = daily_limit
+        self.reset_hour = reset_hour
+        self.wait = wait
+        self.bucket = TokenBucket(rate, burst)
+        self.ledger = QuotaLedger(path)
+        self.lock = threading.Lock()
+
+    def day(self, now=None):
+        """Quota day a moment falls in, as an ISO date"""
+        now = now or datetime.now(timezone.utc)
+        return (now - timedelta(hours=self.reset_hour)).date().isoformat()
+
+    def next_reset(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        start = datetime.fromisoformat(self.day(now)).replace(tzinfo=timezone.utc) + timedelta(hours=self.reset_hour)
+        return start + timedelta(days=1)
+
+    def remaining(self):
+        """Calls left today, None when unlimited"""
+        if self.daily_limit is None:
+            return None
+        with self.lock:
+            return max(0, self.daily_limit - self.ledger.used(self.key, self.day()))
+
+    def acquire(self):
+        """Block until a call is allowed and count it, sleeping through the reset when the day's budget is spent"""
+
+        while True:
+            with self.lock:
+                day = self.day()
+                if self.daily_limit is None or self.ledger.used(self.key, day) < self.daily_limit:
+                    self.ledger.add(self.key, day)
+                    break
+            if not self.wait:
+                raise QuotaExhausted(f"{self.key}: {self.daily_limit} calls used for {day}")
+            delay = (self.next_reset() - datetime.now(timezone.utc)).total_seconds() + 1
+            print(f"{self.key}: daily quota used, pausing until {self.next_reset():%Y-%m-%d %H:%M} UTC")
+            time.sleep(max(0, delay))
+        self.bucket.wait()
+
+    def exhaust(self):
+        """The API reported the limit before the ledger did, so today's budget is gone"""
+        with self.lock:
+            day = self.day()
+            self.ledger.set(self.key, day, max(self.daily_limit or 0, self.ledger.used(self.key, day)))
+
+    def order(self, items, priority):
+        """Pending work sorted by priority(item), lowest first, ties keep their order"""
+        return sorted(items, key=priority)
+
+    def session(self, session, endpoints=None):
+        """Wrap a requests session (or module) so its calls to endpoints (all when None) go through this scheduler"""
+        return QuotaSession(session, self, endpoints)
+
+
+def is_quota_error(response):
+    """Brickset reports an exceeded limit as an error message in an otherwise successful response"""
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("status") == "error" and "limit" in body.get("message", "").lower()
+
+
+class QuotaSession:
+    """Session whose get() acquires a call from a QuotaScheduler first
+
+    When the API answers with a quota error the scheduler is marked exhausted and, if it waits, the call is retried
+    after the reset. Otherwise the error response is returned for the caller to handle.
+    """
+
+    def __init__(self, session, scheduler, endpoints=None):
+        self.session = session
+        self.scheduler = scheduler
+        self.endpoints = None if endpoints is None else set(endpoints)
+
+    def get(self, url, params=None, **kwargs):
+        if self.endpoints is not None and endpoint_name(url) not in self.endpoints:
+            return self.session.get(url, params=params, **kwargs)
+        while True:
+            self.scheduler.acquire()
+            response = self.session.get(url, params=params, **kwargs)
+            if not is_quota_error(response):
+                return response
+            self.scheduler.exhaust()
+            if not self.scheduler.wait:
+                return response
+
+    def close(self):
+        if hasattr(self.session, "close"):
+            self.session.close()
@@ -1,3 +1,4 @@
+from functools import partial
 
 from sklearn.model_selection import KFold, train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
@@ -7,85 +8,87 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 from BootstrapLearner import BootstrapLearner
+from cross_validation import cross_validate
+from dataset import get_feature_matrix
 from PERTLearner import PERTLearner
 
 
-def run_experiment(learner, data, num_folds=3):
+def run_experiment(learner, data, num_folds=3, in_sample=True, n_jobs=-1):
     """Method to train and test learner with certain hypers
 
-    Uses k-fold cross validation
+    Uses k-fold cross validation, each fold trains a fresh forest with learner's constituent, parameters and bags.
+    in_sample can be a fraction or row count to score only a sample of the training split.
+    """
+
+    # Train and evaluate for each fold
+    factory = partial(BootstrapLearner, constituent=learner.learner_type, kwargs=learner.parameters, bags=learner.bags)
+    scores = cross_validate(factory, data, num_folds=num_folds, in_sample=in_sample, n_jobs=n_jobs)
+
+    # Compute the mean scores over all folds
+    mean_rmse_os = scores["RMSE_OS"].mean()
+    mean_correlation_os = scores["Correlation_OS"].mean()
+    mean_rmse_is = scores["RMSE_IS"].mean() if in_sample else np.nan
+    mean_correlation_is = scores["Correlation_IS"].mean() if in_sample else np.nan
+
+    # Return results
+    return mean_rmse_is, mean_correlation_is, mean_rmse_os, mean_correlation_os
+
+
+def run_bag_sweep(data, bag_vals, num_folds=3):
+    """Method to evaluate several bag counts with one forest per fold
+
+    Trains max(bag_vals) bags once per fold and scores the prefix forests of every size in one pass,
+    returns rows of (bags, IS RMSE, IS correlation, OS RMSE, OS correlation, OOB RMSE) averaged over the folds.
+    The out of bag RMSE on the training split needs no held out data, so it shows how well it stands in for OS RMSE
     """
 
     # Set up cross validation
     kf = KFold(n_splits=num_folds, shuffle=True)
 
-    # Train and evaluate for each fold
-    rmse_scores = []
-    correlation_scores = []
-    rmse_in_sample_scores = []
-    correlation_in_sample_scores = []
-    for train_indices, test_indices in kf.split(data):
+    # Train and evaluate for each fold, scores are indexed by [fold, bag value, metric]
+    scores = np.zeros((num_folds, len(bag_vals), 5))
+    for fold, (train_indices, test_indices) in enumerate(kf.split(data)):
         # Get split
         x_train, y_train = data[train_indices, :-1], data[train_indices, -1]
         x_test, y_test = data[test_indices, :-1], data[test_indices, -1]
 
-        # Train and fit
+        # Train the largest forest and get every smaller forest's predictions from it
+        learner = BootstrapLearner(constituent=PERTLearner, kwargs={}, bags=max(bag_vals))
         learner.train(x_train, y_train)
-
-        # Test in sample
-        in_sample_predictions = learner.test(x_train)
-        rmse_in_sample = mean_squared_error(y_train, in_sample_predictions, squared=False)
-        correlation_in_sample = np.corrcoef(y_train.astype(np.float64), in_sample_predictions)[0, 1]
-        rmse_in_sample_scores.append(rmse_in_sample)
-        correlation_in_sample_scores.append(correlation_in_sample)
-
-        # Test out of sample
-        predictions = learner.test(x_test)
-        rmse = mean_squared_error(y_test, predictions, squared=False)
-        correlation = np.corrcoef(y_test.astype(np.float64), predictions)[0, 1]
-        rmse_scores.append(rmse)
-        correlation_scores.append(correlation)
+        in_sample_predictions = learner.test_prefix(x_train)
+        predictions = learner.test_prefix(x_test)
+        oob_predictions = learner.oob_prefix(x_train)
+
+        for i, num_bags in enumerate(bag_vals):
+            scores[fold, i, 0] = mean_squared_error(y_train, in_sample_predictions[num_bags - 1], squared=False)
+            scores[fold, i, 1] = np.corrcoef(y_train.astype(np.float64), in_sample_predictions[num_bags - 1])[0, 1]
+            scores[fold, i, 2] = mean_squared_error(y_test, predictions[num_bags - 1], squared=False)
+            scores[fold, i, 3] = np.corrcoef(y_test.astype(np.float64), predictions[num_bags - 1])[0, 1]
+            has_estimate = ~np.isnan(oob_predictions[num_bags - 1])
+            scores[fold, i, 4] = mean_squared_error(y_train[has_estimate], oob_predictions[num_bags - 1, has_estimate],
+                                                    squared=False)
 
     # Compute the mean scores over all folds
-    mean_rmse_os = np.mean(rmse_scores)
-    mean_correlation_os = np.mean(correlation_scores)
-    mean_rmse_is = np.mean(rmse_in_sample_scores)
-    mean_correlation_is = np.mean(correlation_in_sample_scores)
-
-    # Return results
-    return mean_rmse_is, mean_correlation_is, mean_rmse_os, mean_correlation_os
+    experiment_storage = np.zeros((len(bag_vals), 6))
+    experiment_storage[:, 0] = bag_vals
+    experiment_storage[:, 1:6] = scores.mean(axis=0)
+    return experiment_storage
 
 
 def main():
 
     # Set up data
-    data = pd.read_csv("../data/custom_8.csv", delimiter=",", quotechar='"')
-    data["Minifigures"] = data["Minifigures"].fillna(0)  # Fill in missing minifigure data with 0
-    data["Pieces"] = data["Pieces"].fillna(-1)  # Fill in missing piece data with 0
-    data["Theme"] = data["Theme"].astype('category').cat.codes  # Categorical code approach
-    # counts = data["Theme"].value_counts().to_dict()  # Frequency encoding approach, some themes have same count tho
-    # data["Theme"] = data["Theme"].map(counts)
-    data = data.dropna(subset=["USD_MSRP", "Current_Price"])  # Drop rows with missing data
-    clean = data[["Year", "Theme", "Pieces", "Minifigures", "Rating", "Owned", "USD_MSRP", "Current_Price"]]
-    data = clean.to_numpy()
+    data = get_feature_matrix(["Year", "Theme", "Pieces", "Minifigures", "Rating", "Owned", "USD_MSRP", "Current_Price"])
 
     # Run experiments to tune hyperparameters
     bag_vals = list(range(1, 10)) + list(range(10, 50, 5))
-    experiment_storage = np.zeros((len(bag_vals), 5))
-    for num_bags, i in zip(bag_vals, range(len(bag_vals))):
-        print(f"Running experiment with {num_bags} bags")
-
-        # Set up learner
-        learner = BootstrapLearner(constituent=PERTLearner, kwargs={}, bags=num_bags)
-
-        # Run experiment
-        results = run_experiment(learner, data)
-        experiment_storage[i, 0] = num_bags
-        experiment_storage[i, 1:5] = results
+    print(f"Running experiments with {bag_vals[0]} to {bag_vals[-1]} bags")
+    experiment_storage = run_bag_sweep(data, bag_vals)
 
     # Plot experiment results
-    exp_data = pd.DataFrame(experiment_storage, columns=["Bags", "IS RMSE", "IS Correlation", "OS RMSE", "OS Correlation"])
-    exp_data.plot(x="Bags", y=["IS RMSE", "OS RMSE"])
+    columns = ["Bags", "IS RMSE", "IS Correlation", "OS RMSE", "OS Correlation", "OOB RMSE"]
+    exp_data = pd.DataFrame(experiment_storage, columns=columns)
+    exp_data.plot(x="Bags", y=["IS RMSE", "OS RMSE", "OOB RMSE"])
     plt.xlabel("Number of Bags")
     plt.ylabel("RMSE")
     plt.title("RMSE vs Number of Bags for Random Forest Price Prediction")
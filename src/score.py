@@ -0,0 +1,170 @@
+# Batch scoring of a whole catalog with a saved model
+# The input CSV is streamed in fixed size chunks, each chunk gets the shared preprocessing (clean_sets with the stable
+# Theme codes of the training data) and is scored in a process pool where every worker loads the model once
+# (a saved forest is memory mapped, so workers share its pages). Only a bounded window of chunks is in flight and
+# results are appended to the output in input order, so memory stays flat however many rows there are.
+# Models with a Gap input are forecast models (see dataset.forecast_inputs): they get the same Gap and current price
+# inputs get_forecast scores with, and their gain is over the current price. Sets missing any model input get no
+# prediction. A second pass over the output adds each set's rank by predicted gain.
+#
+# Usage: python score.py forest.model --input ../data/custom_8.csv --output predictions.csv
+
+import argparse
+from collections import deque
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from BootstrapLearner import BootstrapLearner
+from dataset import DATA_PATH, clean_sets, forecast_inputs, load_theme_codes
+from model_io import MAGIC, load_arrays
+from models import predict_model
+from parallel import iter_parallel
+from PERTLearner import PERTLearner
+
+FEATURES = ["Year", "Pieces", "Theme", "Minifigures", "Rating", "Owned", "USD_MSRP"]
+MODELS = {"BootstrapLearner": BootstrapLearner, "PERTLearner": PERTLearner}
+
+
+def load_model(path):
+    """A forest or tree saved in the model file format, or any pickled fit/predict model such as an MLP pipeline"""
+
+    with open(path, "rb") as f:
+        is_model_file = f.read(len(MAGIC)) == MAGIC
+    if not is_model_file:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    _, meta = load_arrays(path)
+    return MODELS[meta["model"]].load(path)
+
+
+def model_features(model, features=None):
+    """Input columns to score model with, checked against the names and width recorded with the model
+
+    features defaults to the names saved with the model, or FEATURES for models saved without them.
+    """
+
+    names = getattr(model, "features", None)
+    if names is None and hasattr(model, "feature_names_in_"):
+        names = list(model.feature_names_in_)
+    width = getattr(model, "n_features", None) or getattr(model, "n_features_in_", None)
+
+    features = list((names or FEATURES) if features is None else features)
+    if names is not None and features != list(names):
+        raise ValueError(f"Model was trained on {list(names)}, not {features}")
+    if width is not None and len(features) != width:
+        raise ValueError(f"Model was trained on {width} features, got {len(features)}: {features}")
+    return features
+
+
+def feature_matrix(chunk, theme_codes, features=FEATURES, year=None):
+    """Model inputs for a chunk of raw sets and the base price their gains are over
+
+    With Gap in features the inputs forecast from today's price to year, as in experiments.get_forecast.
+    """
+    data = clean_sets(chunk, theme_codes)
+    if "Gap" in features:
+        data = forecast_inputs(data, year)
+    return data[list(features)].to_numpy(dtype=np.float64), data["USD_MSRP"].to_numpy(dtype=np.float64)
+
+
+def predict_rows(model, x):
+    """Predictions for the rows with every input present, NaN for the rest (not every model accepts NaN inputs)"""
+    complete = ~np.isnan(x).any(axis=1)
+    predictions = np.full(len(x), np.nan)
+    if complete.any():
+        predictions[complete] = predict_model(model, x[complete])
+    return predictions
+
+
+def add_predictions(chunk, predictions, base_prices):
+    """Raw chunk with its Prediction and Predicted_Gain over the base price"""
+    chunk = chunk.copy()
+    chunk["Prediction"] = predictions
+    chunk["Predicted_Gain"] = predictions / base_prices - 1
+    return chunk
+
+
+def rank_output(path, gains, chunk_size):
+    """Second pass: add Rank (1 is the highest predicted gain, blank without a gain) to the scored file in place"""
+
+    # Ranks for every row come from the gains alone, so only one float per row is held in memory
+    valid = np.flatnonzero(~np.isnan(gains))
+    ranks = np.zeros(len(gains), dtype=np.int64)
+    ranks[valid[np.argsort(-gains[valid], kind="stable")]] = np.arange(1, len(valid) + 1)
+
+    temporary = path + ".ranking"
+    start = 0
+    for i, chunk in enumerate(pd.read_csv(path, chunksize=chunk_size, low_memory=False)):
+        chunk_ranks = ranks[start:start + len(chunk)]
+        chunk["Rank"] = pd.array(np.where(chunk_ranks > 0, chunk_ranks, None), dtype="Int64")
+        chunk.to_csv(temporary, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        start += len(chunk)
+    os.replace(temporary, path)
+
+
+def score_catalog(model_path, input_path=DATA_PATH, output_path="predictions.csv", features=None, year=None,
+                  chunk_size=100_000, n_jobs=-1, theme_codes=None):
+    """Score every row of input_path with the model at model_path and write them with Prediction, Predicted_Gain
+    and Rank to output_path, returns the number of rows scored
+
+    features default to the ones saved with the model and must match them, see model_features.
+    Theme codes default to the training data's so codes match what the model was trained on.
+    """
+
+    features = model_features(load_model(model_path), features)
+    if "Gap" in features and year is None:
+        raise ValueError("year is required when the features include Gap")
+    theme_codes = load_theme_codes() if theme_codes is None else theme_codes
+    chunks = pd.read_csv(input_path, chunksize=chunk_size, low_memory=False)
+    gains = []
+
+    def write(chunk):
+        chunk.to_csv(output_path, mode="a" if gains else "w", header=not gains, index=False)
+        gains.append(chunk["Predicted_Gain"].to_numpy(dtype=np.float64))
+
+    # Chunks wait in order for their predictions, at most two per worker are in flight
+    waiting = deque()
+
+    def tasks():
+        for chunk in chunks:
+            x, base_prices = feature_matrix(chunk, theme_codes, features, year)
+            waiting.append((chunk, base_prices))
+            yield (x,)
+
+    for _, predictions in iter_parallel(predict_rows, tasks(), n_jobs, shared=model_path, load=load_model):
+        chunk, base_prices = waiting.popleft()
+        write(add_predictions(chunk, predictions, base_prices))
+
+    gains = np.concatenate(gains) if gains else np.array([])
+    if len(gains):
+        rank_output(output_path, gains, chunk_size)
+    return len(gains)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every set in a catalog CSV with a saved model")
+    parser.add_argument("model", help="forest or tree saved with save(), or a pickled fit/predict model")
+    parser.add_argument("--input", default=DATA_PATH, help="catalog CSV with the raw sets columns")
+    parser.add_argument("--output", default="predictions.csv")
+    parser.add_argument("--features", nargs="+", help="model inputs in training order, by default the ones saved "
+                                                       "with the model (or the standard features if none were)")
+    parser.add_argument("--year", type=int, default=None, help="year to forecast for when the features include Gap")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="worker processes, -1 for all cores")
+    args = parser.parse_args()
+    try:
+        features = model_features(load_model(args.model), args.features)
+    except ValueError as e:
+        parser.error(str(e))
+    if "Gap" in features and args.year is None:
+        parser.error("--year is required when the features include Gap")
+
+    rows = score_catalog(args.model, args.input, args.output, features, args.year, args.chunk_size, args.n_jobs)
+    print(f"Scored {rows} sets into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
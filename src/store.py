@@ -0,0 +1,178 @@
+# Typed columnar store for the data sets, an alternative to re-parsing the custom_N.csv snapshots
+# Every column is one .npy file named by the hash of its contents. String columns are dictionary encoded: int32 codes
+# (-1 for missing) plus a sorted dictionary of the distinct values. A snapshot is a JSON schema listing each column's
+# dtype and files, snapshots are append-only versions per data set, and a column that did not change between versions
+# (or data sets) points at the same file instead of being written again.
+# Loads memory map only the requested columns.
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/store")
+
+
+def _hash_array(array):
+    array = np.ascontiguousarray(array)
+    return hashlib.sha1(f"{array.dtype.str}{array.shape}".encode() + array.tobytes()).hexdigest()
+
+
+def encode_strings(values):
+    """Dictionary encode a column of strings, returns (codes, dictionary), missing values get code -1
+
+    Values that are not strings (e.g. numbers in a mixed column) are stored as their text.
+    """
+    values = pd.Series(values, dtype=object)
+    present = values.notna().to_numpy()
+    dictionary, codes = np.unique(values[present].astype(str).to_numpy(dtype=str), return_inverse=True)
+    all_codes = np.full(len(values), -1, dtype=np.int32)
+    all_codes[present] = codes
+    return all_codes, dictionary
+
+
+def decode_strings(codes, dictionary):
+    """Object array of strings with NaN for missing values"""
+    codes = np.asarray(codes)
+    present = codes >= 0
+    decoded = np.full(len(codes), np.nan, dtype=object)
+    decoded[present] = np.asarray(dictionary, dtype=object)[codes[present]]
+    return decoded
+
+
+class DatasetStore:
+    """Versioned column store under path, one directory of snapshot schemas per data set"""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.columns_dir = os.path.join(path, "columns")
+        self.snapshots_dir = os.path.join(path, "snapshots")
+        os.makedirs(self.columns_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    def _write_array(self, array):
+        """Write an array under its content hash unless an identical one is already stored"""
+        name = _hash_array(array)
+        path = os.path.join(self.columns_dir, name + ".npy")
+        if not os.path.exists(path):
+            temporary = path + ".tmp.npy"
+            np.save(temporary, np.ascontiguousarray(array), allow_pickle=False)
+            os.replace(temporary, path)
+        return name
+
+    def _read_array(self, name, mmap=True):
+        return np.load(os.path.join(self.columns_dir, name + ".npy"), mmap_mode="r" if mmap else None,
+                       allow_pickle=False)
+
+    def versions(self, name):
+        """Snapshot versions of a data set, oldest first"""
+        directory = os.path.join(self.snapshots_dir, name)
+        if not os.path.isdir(directory):
+            return []
+        files = os.listdir(directory)
+        return sorted(int(file[1:-5]) for file in files if file.startswith("v") and file.endswith(".json"))
+
+    def schema(self, name, version=None):
+        """Schema of a snapshot, the latest by default"""
+        versions = self.versions(name)
+        if not versions:
+            raise KeyError(f"No snapshots of {name}")
+        version = versions[-1] if version is None else version
+        with open(os.path.join(self.snapshots_dir, name, f"v{version}.json")) as f:
+            return json.load(f)
+
+    def commit(self, name, frame, meta=None):
+        """Store frame as the next snapshot of name, returns its version (the latest one if nothing changed)"""
+
+        columns = {}
+        for column in frame.columns:
+            values = frame[column]
+            if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+                codes, dictionary = encode_strings(values)
+                columns[column] = {"kind": "dictionary", "dtype": "str", "codes": self._write_array(codes),
+                                   "dictionary": self._write_array(dictionary)}
+            else:
+                array = values.to_numpy()
+                columns[column] = {"kind": "array", "dtype": array.dtype.str, "data": self._write_array(array)}
+
+        # Nothing changed since the latest snapshot
+        versions = self.versions(name)
+        if versions and self.schema(name)["columns"] == columns and self.schema(name)["meta"] == (meta or {}):
+            return versions[-1]
+
+        version = (versions or [0])[-1] + 1
+        schema = {"name": name, "version": version, "rows": len(frame), "created": time.time(),
+                  "columns": columns, "meta": meta or {}}
+        directory = os.path.join(self.snapshots_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"v{version}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(schema, f, indent=1)
+        os.replace(path + ".tmp", path)
+        return version
+
+    def load_columns(self, name, columns=None, version=None, mmap=True):
+        """{column: array} of a snapshot, numeric columns memory mapped, strings decoded to objects"""
+
+        schema = self.schema(name, version)
+        arrays = {}
+        for column in columns or list(schema["columns"]):
+            entry = schema["columns"][column]
+            if entry["kind"] == "dictionary":
+                arrays[column] = decode_strings(self._read_array(entry["codes"], mmap),
+                                                self._read_array(entry["dictionary"], mmap=False))
+            else:
+                arrays[column] = self._read_array(entry["data"], mmap)
+        return arrays
+
+    def load(self, name, columns=None, version=None):
+        """A snapshot (or some of its columns) as a DataFrame"""
+        return pd.DataFrame(self.load_columns(name, columns, version), columns=columns)
+
+    def find(self, name, **meta):
+        """Latest version of name whose meta matches every given item, None if there is none"""
+        for version in reversed(self.versions(name)):
+            schema_meta = self.schema(name, version)["meta"]
+            if all(schema_meta.get(key) == value for key, value in meta.items()):
+                return version
+        return None
+
+    def import_csv(self, path, name=None):
+        """Snapshot a CSV unless the latest snapshot already came from this exact file, returns the version"""
+
+        stat = os.stat(path)
+        source = {"source": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        version = self.find(name, **source)
+        if version is None:
+            version = self.commit(name, pd.read_csv(path, low_memory=False), source)
+        return version
+
+
+def read_csv(path, columns=None, store_path=STORE_DIR):
+    """Read a CSV through the store, snapshotting it the first time it is seen (or after it changes)"""
+    store = DatasetStore(store_path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return store.load(name, columns, version=store.import_csv(path, name))
+
+
+def main():
+
+    # Snapshot every data set, columns shared between the custom_N versions are only stored once
+    store = DatasetStore()
+    data_dir = os.path.dirname(STORE_DIR)
+    for file in sorted(os.listdir(data_dir)):
+        if file.endswith(".csv"):
+            version = store.import_csv(os.path.join(data_dir, file))
+            schema = store.schema(os.path.splitext(file)[0], version)
+            print(f"{file}: version {version}, {schema['rows']} rows, {len(schema['columns'])} columns")
+    files = os.listdir(store.columns_dir)
+    size = sum(os.path.getsize(os.path.join(store.columns_dir, file)) for file in files)
+    print(f"{len(files)} column files, {size / 2 ** 20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
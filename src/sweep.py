@@ -0,0 +1,137 @@
+# Hyperparameter sweeps over a parameter grid with k-fold cross validation
+# Every (params, data hash, fold count, fold, seed) result is kept in a local SQLite store, so rerunning an
+# interrupted sweep or extending its grid only computes the missing cells. Cells are independent and run in a process pool.
+
+from functools import partial
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+from BootstrapLearner import BootstrapLearner
+from cross_validation import fold_metrics, run_fold
+from dataset import CACHE_DIR, get_feature_matrix
+from neural_net import get_data, mlp_pipeline
+from parallel import iter_parallel
+from PERTLearner import PERTLearner
+
+RESULTS_PATH = os.path.join(CACHE_DIR, "sweeps.sqlite")
+
+
+def data_hash(data):
+    """Fingerprint of a data matrix so results from different data never mix"""
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    return hashlib.sha1(str(data.shape).encode() + data.tobytes()).hexdigest()
+
+
+def grid_points(grid):
+    """Every combination of a {param: [values]} grid as a list of param dicts"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _open_store(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+
+    # Results stored before the fold count was part of the key cannot tell which split a fold came from
+    columns = {column[1] for column in connection.execute("PRAGMA table_info(results)")}
+    if columns and "num_folds" not in columns:
+        connection.execute("DROP TABLE results")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            model TEXT, params TEXT, data_hash TEXT, num_folds INTEGER, fold INTEGER, seed INTEGER,
+            rmse REAL, correlation REAL, r2 REAL,
+            PRIMARY KEY (model, params, data_hash, num_folds, fold, seed)
+        )
+    """)
+    connection.commit()
+    return connection
+
+
+def evaluate_cell(data, train_indices, test_indices, model_factory, params):
+    """Train model_factory(**params) on one fold, returns out of sample RMSE, correlation and R^2"""
+
+    predictions, _ = run_fold(data, train_indices, test_indices, partial(model_factory, **params))
+    rmse, correlation, r_squared = fold_metrics(data[test_indices, -1], predictions,
+                                                np.zeros(len(test_indices), dtype=int), 1)
+    return rmse[0], correlation[0], r_squared[0]
+
+
+def run_sweep(model, model_factory, grid, data, num_folds=3, seeds=(0,), seed_param=None, n_jobs=-1,
+              store_path=RESULTS_PATH):
+    """Cross validate model_factory(**params) for every point of grid, reusing stored results
+
+    model names the factory in the store. data holds the features followed by the target column.
+    Each seed gives a different fold split, and is also passed to the factory as seed_param when set.
+    Returns a table with a row per grid point and the mean RMSE, correlation and R^2 over folds and seeds.
+    """
+
+    points = grid_points(grid)
+    fingerprint = data_hash(data)
+    connection = _open_store(store_path)
+    stored = {(params, fold, seed) for params, fold, seed in connection.execute(
+        "SELECT params, fold, seed FROM results WHERE model = ? AND data_hash = ? AND num_folds = ?",
+        (model, fingerprint, num_folds))}
+
+    # Work out which (params, fold, seed) cells still need to run
+    cells = []
+    for seed in seeds:
+        splits = list(KFold(n_splits=num_folds, shuffle=True, random_state=seed).split(data))
+        for params, (fold, (train_indices, test_indices)) in itertools.product(points, enumerate(splits)):
+            key = json.dumps(params, sort_keys=True)
+            if (key, fold, seed) not in stored:
+                factory_params = dict(params, **{seed_param: seed}) if seed_param else params
+                cells.append((key, fold, seed, factory_params, train_indices, test_indices))
+    print(f"Sweep {model}: {len(cells)} of {len(points) * num_folds * len(seeds)} cells to run")
+
+    # Store each cell as soon as it finishes so an interrupted sweep keeps its progress
+    def store(cell, scores):
+        key, fold, seed = cell[:3]
+        connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (model, key, fingerprint, num_folds, fold, seed, *map(float, scores)))
+        connection.commit()
+
+    tasks = [(*cell[4:], model_factory, cell[3]) for cell in cells]
+    for index, scores in iter_parallel(evaluate_cell, tasks, n_jobs, shared=data, ordered=False):
+        store(cells[index], scores)
+
+    # Collect this sweep's cells and average them per grid point
+    results = pd.read_sql_query("SELECT params, fold, seed, rmse, correlation, r2 FROM results "
+                                "WHERE model = ? AND data_hash = ? AND num_folds = ?", connection,
+                                params=(model, fingerprint, num_folds))
+    connection.close()
+    keys = [json.dumps(params, sort_keys=True) for params in points]
+    results = results[results["params"].isin(keys) & results["seed"].isin(seeds)]
+    summary = results.groupby("params")[["rmse", "correlation", "r2"]].mean().reindex(keys)
+    table = pd.DataFrame(points)
+    table["RMSE"] = summary["rmse"].to_numpy()
+    table["Correlation"] = summary["correlation"].to_numpy()
+    table["R2"] = summary["r2"].to_numpy()
+    return table
+
+
+def main():
+
+    # Current price from the sets features, like random_forest.py
+    data = get_feature_matrix(["Year", "Theme", "Pieces", "Minifigures", "Rating", "Owned", "USD_MSRP", "Current_Price"])
+
+    # Random forest bag counts
+    forest = partial(BootstrapLearner, constituent=PERTLearner, kwargs={})
+    print(run_sweep("BootstrapLearner(PERTLearner)", forest, {"bags": [10, 20, 30, 40]}, data, seed_param="seed"))
+
+    # Neural network shape and training length, for the standardized network and list price data of neural_net.py
+    mlp_grid = {
+        "hidden_layer_sizes": [(35, 45, 55), (64, 64), (100,)],
+        "max_iter": [2000, 4000],
+    }
+    print(run_sweep("StandardScaler+MLPRegressor", mlp_pipeline, mlp_grid, get_data(), seed_param="random_state"))
+
+
+if __name__ == "__main__":
+    main()